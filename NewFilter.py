@@ -1,8 +1,208 @@
 import streamlit as st
 from streamlit.errors import StreamlitAPIException
+import numpy as np
 import pandas as pd
 
 
+MASK_CACHE = '_filter_masks'  # Session state key of the memoized masks and options
+MASK_CACHE_SIZE = 32  # Masks kept per session, the oldest is dropped first
+
+
+class FilterIndex:
+    """
+    Categorical index of the filter columns of a dataframe.
+
+    ...
+
+    Every column is factorized once into an integer code per row and the list of its
+    distinct values. The mask of a selection is a lookup table of the selected codes
+    indexed with the code array, and the masks of several columns are combined with
+    bitwise AND, so no filter copies the dataframe or compares values.
+
+    Attributes
+    ----------
+    columns : list
+        Indexed columns.
+    codes : dict
+        Column -> int32 array with the code of every row.
+    values : dict
+        Column -> pd.Index of the distinct values, in order of first appearance.
+
+    Methods
+    -------
+    mask(selections, except_column=None):
+        Returns the boolean row mask of the selections.
+    options(selections):
+        Returns, for every column, the values left by the selections of the other columns.
+    """
+
+    def __init__(self, df, columns):
+        self.columns = list(columns)
+        self.size = len(df)
+        self.codes = {}
+        self.values = {}
+        for column in self.columns:
+            # Missing values get a code of their own, they stay selectable like with isin
+            codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+            self.codes[column] = codes.astype(np.int32)
+            self.values[column] = pd.Index(uniques, dtype=object)
+
+    def column_mask(self, column, values):
+        # Rows whose value is one of the given values, values not in the column match nothing
+        found = self.values[column].get_indexer(list(values))
+        lookup = np.zeros(len(self.values[column]), dtype=bool)
+        lookup[found[found >= 0]] = True
+        return lookup[self.codes[column]]
+
+    def masks(self, selections):
+        # Masks of the columns with a non-empty selection
+        return {column: self.column_mask(column, values)
+                for column, values in selections.items() if values and column in self.codes}
+
+    def mask(self, selections, except_column=None):
+        """
+        Combines the selections into one row mask.
+
+        Parameters
+        ----------
+        selections : dict
+            Column -> list of selected values, an empty list selects everything.
+        except_column : str, optional
+            Column whose selection is ignored.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the matching rows.
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for column, column_mask in self.masks(selections).items():
+            if column != except_column:
+                mask &= column_mask
+        return mask
+
+    def options(self, selections):
+        """
+        Finds the values every filter can still offer, given the selections of the other filters.
+
+        The column masks are computed once, the mask of "all others" of each column is
+        the AND of the masks before it (prefix) and after it (suffix).
+
+        Parameters
+        ----------
+        selections : dict
+            Column -> list of selected values.
+
+        Returns
+        -------
+        dict
+            Column -> list of values present in the rows matching the other selections.
+        """
+        masks = self.masks(selections)
+        active = list(masks)
+        everything = np.ones(self.size, dtype=bool)
+        # prefix[i] is the AND of the first i masks, suffix[i] of the masks from i on
+        prefix = [everything]
+        for column in active:
+            prefix.append(prefix[-1] & masks[column])
+        suffix = [everything]
+        for column in reversed(active):
+            suffix.append(suffix[-1] & masks[column])
+        suffix.reverse()
+
+        options = {}
+        for column in self.columns:
+            if column in masks:
+                position = active.index(column)
+                others = prefix[position] & suffix[position + 1]
+            else:
+                others = prefix[-1]
+            present = np.bincount(self.codes[column][others], minlength=len(self.values[column])) > 0
+            options[column] = self.values[column][present].tolist()
+        return options
+
+
+@st.cache_resource(max_entries=8)
+def shared_index(name, version, columns, _df):
+    # One index per dataset, data version and filter set for all sessions
+    # (_df is not hashed, name and version identify it)
+    return FilterIndex(_df, columns)
+
+
+def frozen_filters(filters):
+    # Hashable form of a filter state, empty selections do not filter and are left out
+    return tuple((column, tuple(values)) for column, values in filters.items() if values)
+
+
+def memoized(kind, index, version, filters, compute):
+    """
+    Returns compute() memoized in session state per (kind, index, data version, filter state).
+
+    Parameters
+    ----------
+    kind : hashable
+        What is computed, e.g. ('mask', None) or 'options'.
+    index : FilterIndex
+        Shared index the result is computed from.
+    version : hashable or None
+        Data version, nothing is memoized without one.
+    filters : dict
+        Column -> list of selected values.
+    compute : callable
+        Computes the result.
+
+    Returns
+    -------
+    object
+        The memoized or computed result, masks are read-only.
+    """
+    if version is None:
+        return compute()
+    cache = st.session_state.setdefault(MASK_CACHE, {})
+    key = (kind, id(index), version, frozen_filters(filters))
+    if key not in cache:
+        while len(cache) >= MASK_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+        result = compute()
+        if isinstance(result, np.ndarray):
+            # Callers combine masks with & into new arrays, the memoized one is never changed
+            result.flags.writeable = False
+        cache[key] = result
+    return cache[key]
+
+
+def filter_mask(df, filters, index=None, version=None, except_filter=None):
+    """
+    Boolean row mask of a filter state, without copying the dataframe.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The dataframe on which filters are applied.
+    filters : dict
+        Column -> list of selected values, an empty list selects everything.
+    index : FilterIndex, optional
+        Index of df over the filter columns, the mask is then memoized per data version.
+    version : hashable, optional
+        Data version of df.
+    except_filter : str, optional
+        Column whose selection is ignored.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask, df[mask] gives the filtered rows.
+    """
+    if index is not None:
+        return memoized(('mask', except_filter), index, version, filters,
+                        lambda: index.mask(filters, except_filter))
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in filters.items():
+        if column != except_filter and values:
+            mask &= df[column].isin(values).to_numpy()
+    return mask
+
+
 class MyFilter:
     """
     A class to create dynamic multi-select filters in Streamlit.
@@ -20,13 +220,15 @@ class MyFilter:
     -------
     check_state():
         Initializes the session state with filters if not already set.
+    selections():
+        Returns the selected values of every filter.
     filter_df(except_filter=None):
         Returns the dataframe filtered based on session state excluding the specified filter.
     display():
         Renders the dynamic filters and the filtered dataframe in Streamlit.
     """
 
-    def __init__(self, df, filters_name):
+    def __init__(self, df, filters_name, index=None, version=None, key=None):
         """
         Constructs all the necessary attributes for the DynamicFilters object.
 
@@ -34,13 +236,21 @@ class MyFilter:
         ----------
             df : DataFrame
                 The dataframe on which filters are applied.
-            filters : list of filters
+            filters_name : list
                 List of columns names in df for which filters are to be created.
-            filters_name: str, optional
-                Name of the filters object in session state.
+            index : FilterIndex, optional
+                Prebuilt index of df over the filter columns, built here by default.
+            version : hashable, optional
+                Data version of df, masks and options are memoized per version in session state.
+            key : str, optional
+                Name of the filters object in session state, derived from the columns by default.
         """
         self.df = df
         self.filters_name = filters_name
+        # Session state keys are strings, the column list itself is not used as one
+        self.key = key if key is not None else 'filters_' + '_'.join(filters_name)
+        self.index = index if index is not None else FilterIndex(df, filters_name)
+        self.version = version
         self.filters = {filter_name: [] for filter_name in self.filters_name}
         self.check_state()
 
@@ -48,8 +258,12 @@ class MyFilter:
         """Initializes the session state with filters if not already set."""
         # if 'filters' not in st.session_state:
         #     st.session_state.filters = self.filters
-        if self.filters_name not in st.session_state:
-            st.session_state[self.filters_name] = self.filters
+        if self.key not in st.session_state:
+            st.session_state[self.key] = self.filters
+
+    def selections(self):
+        """Returns the selected values of every filter, a dict kept in session state."""
+        return st.session_state[self.key]
 
     def filter(self, except_filter=None):
         """
@@ -65,11 +279,17 @@ class MyFilter:
             DataFrame
                 Filtered dataframe.
         """
-        filtered_df = self.df.copy()
-        for key, values in st.session_state[self.filters_name].items():
-            if key != except_filter and values:
-                filtered_df = filtered_df[filtered_df[key].isin(values)]
-        return filtered_df
+        # One boolean indexing instead of a copy and a filtered copy per column
+        return self.df[self.mask(except_filter)]
+
+    def mask(self, except_filter=None):
+        """Returns the boolean row mask of the session state filters, memoized while they do not change."""
+        return filter_mask(self.df, st.session_state[self.key], self.index, self.version, except_filter)
+
+    def options(self):
+        """Returns the options of every filter given the other filters, memoized like mask()."""
+        filters = st.session_state[self.key]
+        return memoized('options', self.index, self.version, filters, lambda: self.index.options(filters))
 
     def display_filters(self, location=None, num_columns=0, gap="small"):
         """
@@ -129,7 +349,7 @@ class MyFilter:
         if num_columns > 8:
             raise StreamlitAPIException("num_columns must be less than or equal to 8")
         # if num_columns is greater than the number of filters
-        if num_columns > len(st.session_state[self.filters_name]) + 1:
+        if num_columns > len(st.session_state[self.key]) + 1:
             raise StreamlitAPIException("num_columns must be less than or equal to the number of filters")
         # if location is column and num_columns is 0
         if location == 'columns' and num_columns == 0:
@@ -145,24 +365,26 @@ class MyFilter:
             max_value = num_columns
             col_list = st.columns(num_columns, gap=gap)
 
-        for filter_name in st.session_state[self.filters_name].keys():
-            filtered_df = self.filter(filter_name)
-            options = filtered_df[filter_name].unique().tolist()
+        # Options of every filter given all the other filters, computed in one pass
+        all_options = self.options()
+
+        for filter_name in st.session_state[self.key].keys():
+            options = all_options[filter_name]
 
             # Remove selected values that are not in options anymore
-            valid_selections = [v for v in st.session_state[self.filters_name][filter_name] if v in options]
-            if valid_selections != st.session_state[self.filters_name][filter_name]:
-                st.session_state[self.filters_name][filter_name] = valid_selections
+            valid_selections = [v for v in st.session_state[self.key][filter_name] if v in options]
+            if valid_selections != st.session_state[self.key][filter_name]:
+                st.session_state[self.key][filter_name] = valid_selections
                 filters_changed = True
 
             if location == 'sidebar':
                 with st.sidebar:
                     selected = st.multiselect(f"Select {filter_name}", options,
-                                              default=st.session_state[self.filters_name][filter_name])
+                                              default=st.session_state[self.key][filter_name])
             elif location == 'columns' and num_columns > 0:
                 with col_list[counter - 1]:
                     selected = st.multiselect(f"Select {filter_name}", options,
-                                              default=st.session_state[self.filters_name][filter_name])
+                                              default=st.session_state[self.key][filter_name])
 
                 # increase counter and reset to 1 if max_value is reached
                 counter += 1
@@ -171,10 +393,10 @@ class MyFilter:
                     counter = 1
             else:
                 selected = st.multiselect(f"Select {filter_name}", options,
-                                          default=st.session_state[self.filters_name][filter_name])
+                                          default=st.session_state[self.key][filter_name])
 
-            if selected != st.session_state[self.filters_name][filter_name]:
-                st.session_state[self.filters_name][filter_name] = selected
+            if selected != st.session_state[self.key][filter_name]:
+                st.session_state[self.key][filter_name] = selected
                 filters_changed = True
 
         if filters_changed:
@@ -1,44 +1,176 @@
 import pandas as pd
 import streamlit as st
 from streamlit_dynamic_filters import DynamicFilters
-from datetime import datetime, timedelta
-from NewFilter import MyFilter
-import plotly.figure_factory as ff
+from NewFilter import MyFilter, shared_index, filter_mask
+import plotly.express as px
 import numpy as np
 import plotly.graph_objects as go
-
-
-
-
-
-def app(df_today, df_sold):
-
-    def filter_dataframe(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
-        """
-        This function filters a pandas dataframe based on the provided filters.
-
-        Parameters
-        ----------
-        df: pd.DataFrame
-            The pandas dataframe to be filtered.
-        filters: dict
-            A dictionary containing the filters to be applied to the dataframe. The keys
-            of the dictionary should be the column names, and the values should be a list
-            of values to filter by.
-
-        Returns
-        -------
-        pd.DataFrame
-            The filtered pandas dataframe.
-
-        """
-        filtered_df = df.copy()  # Create a copy of the original DataFrame to avoid modifying it directly
-        # Apply filters to the DataFrame
-        for column, values in filters.items():
-            if values:  # Check if the list of values for the current column is not empty
-                filtered_df = filtered_df[filtered_df[column].isin(values)]
-        
-        return filtered_df
+import os
+from cube import Cube
+from sections import lazy_tabs, paged_table
+from pricetags import PriceSeries, PRICETAGS_PATH
+import soldtime
+
+MAX_PRICE_MODELS = 20  # Models the price dynamics chart compares at most
+TOP_MODELS = 6  # Models shown in the price distribution
+HIST_BINS = 40  # Histogram bars of the price distribution
+KDE_GRID = 256  # Points of the density curves
+TOP_SELLERS = 30  # Sellers shown in the "Общее" tab
+# Filters covered by the selling time cells of the store (Mark, Model, City, Кузов)
+SOLD_TIME_FILTERS = ["Марка", "Модель", "Город", "Кузов"]
+
+
+@st.cache_resource(max_entries=2)
+def shared_cube(version, _df_today):
+    # The aggregate cube of a data version is built once for all sessions
+    return Cube(_df_today)
+
+
+def model_price_stats(compare_df, top=TOP_MODELS):
+    """
+    Picks the most common models and trims their prices to two standard deviations.
+
+    Parameters
+    ----------
+    compare_df : pd.DataFrame
+        "Модель" and "Цена" of the compared cars.
+    top : int
+        Number of models, the most listed first.
+
+    Returns
+    -------
+    tuple
+        (statistics per model with size, mean and std, trimmed rows of these models).
+    """
+    # One groupby pass instead of filtering the frame for every model and statistic
+    # (std with ddof=0 is np.std of the old code, the population standard deviation)
+    stats = compare_df.groupby("Модель")["Цена"].agg(size="size", mean="mean", std=lambda s: s.std(ddof=0))
+    stats = stats.sort_values("size", ascending=False, kind="stable").head(top)
+
+    rows = compare_df[compare_df["Модель"].isin(stats.index)]
+    mean = rows["Модель"].map(stats["mean"])
+    std = rows["Модель"].map(stats["std"])
+    # Keeping the prices within 2 standard deviations from the mean
+    rows = rows[(rows["Цена"] >= mean - 2 * std) & (rows["Цена"] <= mean + 2 * std)]
+    return stats, rows
+
+
+def binned_density(prices, edges, grid):
+    """
+    Histogram and Gaussian kernel density of one model on fixed bins and a fixed grid.
+
+    The prices are counted into the grid cells once and the counts are convolved with
+    the kernel, so the cost of the curve depends on the grid, not on the number of prices.
+
+    Parameters
+    ----------
+    prices : np.ndarray
+        Trimmed prices.
+    edges : np.ndarray
+        Histogram bin edges shared by all models.
+    grid : np.ndarray
+        Evenly spaced points of the density curve.
+
+    Returns
+    -------
+    tuple
+        (histogram density per bin, density at the grid points or None when the
+        prices do not vary).
+    """
+    hist, _ = np.histogram(prices, bins=edges, density=True)
+    # Scott's rule, the bandwidth scipy's gaussian_kde uses
+    bandwidth = np.std(prices, ddof=1) * len(prices) ** (-1 / 5) if len(prices) > 1 else 0
+    if not bandwidth > 0:
+        return hist, None
+    step = grid[1] - grid[0]
+    cells = np.clip(np.rint((prices - grid[0]) / step).astype(np.int64), 0, len(grid) - 1)
+    counts = np.bincount(cells, minlength=len(grid))
+    offsets = np.arange(-len(grid) + 1, len(grid)) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    density = np.convolve(counts, kernel, mode="valid") / len(prices)
+    return hist, density
+
+
+@st.cache_data(max_entries=32)
+def price_distribution(version, filter1, filter2, _compare_df):
+    # The price distribution of the compared cars, computed once per data version and selection
+    # (the frame is not hashed, version and the filters identify it)
+    stats, rows = model_price_stats(_compare_df)
+    fig = go.Figure()
+    if rows.empty:
+        return fig
+    prices = rows["Цена"].to_numpy(dtype=float)
+    low, high = prices.min(), prices.max()
+    if low == high:
+        low, high = low - 1, high + 1
+    edges = np.linspace(low, high, HIST_BINS + 1)
+    grid = np.linspace(low, high, KDE_GRID)
+    colors = px.colors.qualitative.Plotly
+
+    for i, model in enumerate(stats.index):
+        model_prices = prices[(rows["Модель"] == model).to_numpy()]
+        if len(model_prices) == 0:
+            continue
+        hist, density = binned_density(model_prices, edges, grid)
+        color = colors[i % len(colors)]
+        # Only the bars and the curve points are sent, not the prices
+        fig.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=hist, width=np.diff(edges), name=str(model),
+                             legendgroup=str(model), marker_color=color, opacity=0.7))
+        if density is not None:
+            fig.add_trace(go.Scatter(x=grid, y=density, mode="lines", name=str(model), legendgroup=str(model),
+                                     showlegend=False, line=dict(color=color)))
+    fig.update_layout(barmode="overlay", bargap=0)
+    return fig
+
+
+@st.cache_resource(max_entries=2)
+def load_price_series(mtime):
+    # mtime is part of the cache key, a file rewritten by dbworker is loaded again,
+    # the matrix is read-only and shared by all sessions
+    return PriceSeries.load()
+
+
+def top_sellers(filtered_df, df_sellers, top=TOP_SELLERS):
+    """
+    Sellers with the most listings under the current filters.
+
+    Parameters
+    ----------
+    filtered_df : pd.DataFrame
+        Filtered listings with "AuthorID", "Имя автора" and "Цена".
+    df_sellers : pd.DataFrame or None
+        Sellers kept by the store, the names are taken from the listings when it is missing.
+    top : int
+        Number of sellers.
+
+    Returns
+    -------
+    tuple
+        (listings per seller, most first; table with the name, the number and average price of
+        the filtered listings and the sold listings of all time of every seller).
+    """
+    # Count and average price of the filtered listings in one groupby, only the top rows are ordered
+    stats = filtered_df.groupby("AuthorID")["Цена"].agg(count="size", price="mean").nlargest(top, "count")
+    if df_sellers is not None:
+        # The seller table is not filtered: it gives the name and the sales of all time
+        sellers = df_sellers.set_index("AuthorID").reindex(stats.index)
+        names, sold = sellers["AuthorName"], sellers["sold"]
+    else:
+        names = filtered_df.drop_duplicates("AuthorID").set_index("AuthorID")["Имя автора"].reindex(stats.index)
+        sold = pd.Series(np.nan, index=stats.index)
+    table = pd.DataFrame({
+        "AuthorID": stats.index,
+        "Name": names.to_numpy(),
+        "Count": stats["count"].to_numpy(),
+        "Средняя цена": stats["price"].round().to_numpy(),
+        "Продано (всего)": sold.to_numpy(),
+        })
+    return stats["count"], table
+
+
+def app(df_today, df_sold, version=None, df_sold_time=None, df_sellers=None):
+    # df_today, df_sold, df_sold_time and df_sellers are shallow copies of the shared tables: columns
+    # may be renamed or added, but values must not be changed in place
 
     new_names_today = ["Пост", 
                 "PostID", 
@@ -111,9 +243,14 @@ def app(df_today, df_sold):
     
     df_today.columns = new_names_today
     df_sold.columns = new_names_sold
+    if df_sold_time is not None:
+        df_sold_time.columns = [SOLD_TIME_FILTERS[soldtime.DIMENSIONS.index(c)] if c in soldtime.DIMENSIONS else c
+                                for c in df_sold_time.columns]
 
     #Creating Filter
-    filters = MyFilter(df_today, filters_name=filters_today)
+    # The filter indexes of a data version are built once and shared by the sessions
+    index = shared_index('today', version, filters_today, df_today) if version is not None else None
+    filters = MyFilter(df_today, filters_name=filters_today, index=index, version=version, key="somon_filters")
     st.sidebar.header("Задайте фильтры:")
 
     # Adding all filters to sidebar
@@ -124,303 +261,308 @@ def app(df_today, df_sold):
         filters.display_filters()
         
     #Applyting price and year filters to df
-    filtered_df = filters.filter()
-    filtered_df = filtered_df[
-            (filtered_df["Цена"] >= price_from) & (filtered_df["Цена"] <= price_till) &
-            (filtered_df["Год выпуска"] >= year_range[0]) & (filtered_df["Год выпуска"] <= year_range[1])]
+    # The memoized filter mask and the range masks are combined first, the frame is sliced once
+    price = df_today["Цена"].to_numpy()
+    year = df_today["Год выпуска"].to_numpy()
+    filtered_df = df_today[filters.mask() & (price >= price_from) & (price <= price_till) &
+                           (year >= year_range[0]) & (year <= year_range[1])]
+
+    # The charts are roll-ups of the aggregate cube, price is not one of its dimensions,
+    # so a price range (narrower than the data) makes them count the filtered rows instead.
+    # Listings without a price are left out of the bounds, a NaN would always fail the check
+    cube = shared_cube(version, df_today) if version is not None else None
+    cells = None
+    if (cube is not None and len(price) > 0 and
+            price_from <= np.nanmin(price) and price_till >= np.nanmax(price)):
+        cells = cube.mask(filters.selections(), {"Год выпуска": year_range})
+
+    def counts(column):
+        # Listings per value, largest first
+        if cells is not None:
+            return cube.counts(column, cells)
+        return filtered_df[column].value_counts().sort_values(ascending=False)
+
+    def views(column):
+        # Views per value, largest first
+        if cells is not None:
+            return cube.sums(column, cells).reset_index()
+        return filtered_df.groupby([column]).agg({"Просмотры": "sum"}).reset_index().sort_values(by="Просмотры", ascending=False)
+
+    def mean_price(column):
+        # Average price per value, sorted by value
+        if cells is not None:
+            return cube.mean_price(column, cells).reset_index()
+        return filtered_df.groupby(column)["Цена"].mean().reset_index()
 
     # Creating metric cards
     col1, col2, col3, col4, col5 = st.columns(5)
 
     col1.container(border=True).metric("Количество машин:", len(filtered_df))
 
-    if len(filtered_df["Цена"]) > 0:
-        avg_price =int(filtered_df["Цена"].mean())
+    if len(filtered_df) > 0:
+        if cells is not None:
+            avg_price = int(cube.total(cells, "price_sum") / cube.total(cells, "price_count"))
+        else:
+            avg_price =int(filtered_df["Цена"].mean())
     else:
         avg_price = 0
 
     col2.container(border=True).metric("Средняя цена в TJS:", f"{avg_price}")
-    col3.container(border=True).metric("Марки:", len(filtered_df["Марка"].unique()))
-    col4.container(border=True).metric("Модели:", len(filtered_df["Модель"].unique()))
-
-    sold_filtered = filter_dataframe(df_sold, st.session_state["filters"])
-    if len(sold_filtered)>0:
-        avg_sold_time = round(sold_filtered["selling_time_hours"].mean(),1)
+    col3.container(border=True).metric("Марки:", len(counts("Марка")))
+    col4.container(border=True).metric("Модели:", len(counts("Модель")))
+
+    # The selling time statistics are read from the cells kept by the store, the sold rows
+    # are only grouped when a filter the cells do not cover is set
+    selections = filters.selections()
+    if df_sold_time is not None and not any(values for column, values in selections.items()
+                                            if column not in SOLD_TIME_FILTERS):
+        sold_index = shared_index('sold_time', version, SOLD_TIME_FILTERS, df_sold_time) if version is not None else None
+        sold_cells = df_sold_time[filter_mask(df_sold_time, selections, sold_index, version)]
+    else:
+        sold_index = shared_index('sold', version, filters_today, df_sold) if version is not None else None
+        sold_filtered = df_sold[filter_mask(df_sold, selections, sold_index, version)]
+        sold_cells = soldtime.sold_time_cells(sold_filtered, SOLD_TIME_FILTERS, published="Дата публикации")
+    sold_stats = soldtime.sold_time_stats(sold_cells)
+    if len(sold_stats)>0:
+        avg_sold_time = round(sold_stats["mean"].iloc[0],1)
     else:
         avg_sold_time = "Нет данных"
 
     col5.container(border=True).metric("Среднее время продажи.:", f"{avg_sold_time} д")
 
-    main_tab1, main_tab2, main_tab3, main_tab4 = st.tabs(["📈Графики", "🗃Таблицы", "🧮 Сравнение", "📈Динамика Цен"])
-    chart_tabs = main_tab1.tabs(["🏎️Модели", "📋Бренды", "⏲️Публикации", "👨‍💼Общее", "🛢️Вид топлива", "🏙️Города", "🚙Кузов", "📆Год выпуска", "⚙️Коробка передач", "🌈Цвет", "🛠️Объем двигателя"])
-
-    #Модели graphs
-    with chart_tabs[0]:
-        modeltypes = filtered_df["Модель"].value_counts().sort_values(ascending=False)
-        brand_model_views = filtered_df.groupby(["Модель"]).agg({"Просмотры": "sum"}).reset_index()
-
-        # Sort by views in descending order
-        brand_model_views = brand_model_views.sort_values(by="Просмотры", ascending=False)
-
-        chart_tabs[0].header("Cамые распространенные модели")
-        c1, c2 = chart_tabs[0].columns([3, 1])
-        c1.container(border=True).bar_chart(modeltypes.head(30), color="#3c324c")
-        c2.dataframe(modeltypes,width=400)
-        chart_tabs[0].header("Cамые просматриваемые модели")
-        c1, c2 = chart_tabs[0].columns([3, 1])
-        c1.container(border=True).bar_chart(brand_model_views.set_index("Модель").head(30), color="#3c324c")
-        c2.dataframe(brand_model_views, width=400)
-
-    #Brands graphs
-    with chart_tabs[1]:
-        modeltypes = filtered_df["Марка"].value_counts().sort_values(ascending=False)
-        brand_mark_views = filtered_df.groupby(["Марка"]).agg({"Просмотры": "sum"}).reset_index()
-        # Sort by views in descending order
-        brand_mark_views = brand_mark_views.sort_values(by="Просмотры", ascending=False)
-        chart_tabs[1].header("Cамые распространенные модели")
-        c1, c2 = chart_tabs[1].columns([3, 1])
-        c1.container(border=True).bar_chart(modeltypes.head(30), color="#3c324c")
-        c2.dataframe(modeltypes,width=400)
-        chart_tabs[1].header("Cамые просматриваемые модели")
-        c1, c2 = chart_tabs[1].columns([3, 1])
-        c1.container(border=True).bar_chart(brand_mark_views.set_index("Марка").head(30), color="#3c324c")
-        c2.dataframe(brand_mark_views, width=400)
-
-    #Publications graphs
-    with chart_tabs[2]:
-        filtered_df["Дата публикации"] = pd.to_datetime(filtered_df["Дата публикации"], dayfirst=True)
-
-        # Extract just the date component
-        filtered_df["Дата публикации"] = filtered_df["Дата публикации"].dt.date
-        views_per_day = filtered_df.groupby("Дата публикации")["Просмотры"].sum().sort_values(ascending=False)
-
-        # Group by date and count the number of publications made on each day
-        publications_per_day = filtered_df.groupby("Дата публикации").size().sort_values(ascending=False)
-        chart_tabs[2].header("Количество заявок за последние 30 дней")
-        chart_tabs[2].area_chart(publications_per_day.head(30), color="#3c324c")
-        chart_tabs[2].header("Количество просмотров за последние 30 дней")
-        chart_tabs[2].area_chart(views_per_day.head(30), color="#3c324c")
-
-    #Общее graphs
-    with chart_tabs[3]:
-        df_sold_filtered = df_sold.copy()
-        for key, values in st.session_state[filters_today].items():
-            if values:
-                df_sold_filtered = df_sold_filtered[df_sold_filtered[key].isin(values)]
-
-        top_authors = filtered_df["AuthorID"].value_counts().sort_values(ascending=False).head(30)
-        top_authors_df = pd.DataFrame({
-            "AuthorID": top_authors.index,
-            "Name": [filtered_df.loc[filtered_df["AuthorID"] == author_id, "Имя автора"].iloc[0] for author_id in top_authors.index],
-            "Count": top_authors.values
-            })
-        df_sold["sold_date"] = pd.to_datetime(df_sold["sold_date"])
-        most_selling_models = df_sold_filtered.groupby(["Модель"]).size().sort_values(ascending=False).head(30)
-        # Get value counts based on the date without time, formatting dates as strings
-        month_sales = df_sold_filtered["sold_date"].dt.strftime("%Y-%m-%d").value_counts().sort_index(ascending=False)
-        # authors = top_authors["AuthorID"]
-        chart_tabs[3].header("Топ 30 самых активных продавцов")
-        c1, c2 = chart_tabs[3].columns([3, 1])
-        c1.container(border=True).bar_chart(top_authors, color="#3c324c")
-        c2.dataframe(top_authors_df, hide_index=True, width=400)
-        chart_tabs[3].header("Продажи за последние 30 дней")
-        chart_tabs[3].container(border=True).area_chart(month_sales, color="#3c324c")
-        chart_tabs[3].header("Топ 30 продаваемых моделей")
-        chart_tabs[3].container(border=True).bar_chart(most_selling_models, color="#3c324c")
-
-    #Fueltype graphs
-    with chart_tabs[4]:
-        g1, g2 = chart_tabs[4].columns([2,1])
-        fueltypes = filtered_df["Вид топлива"].value_counts()
-        fuel_df = pd.DataFrame(fueltypes)
-        fuel_df["Percentage"] = round((fuel_df["count"] / fuel_df["count"].sum()) * 100, 1)
-        g1.container(border=True).bar_chart(fueltypes, color="#3c324c")
-        g2.dataframe(fuel_df)
-
-    #City graphs
-    with chart_tabs[5]:
-        citytypes = filtered_df["Город"].value_counts()
-        chart_tabs[5].container(border=True).bar_chart(citytypes, color="#3c324c")
-
-    #Kuzov graphs
-    with chart_tabs[6]:
-        g1, g2 = chart_tabs[6].columns(2)
-        kuzovtypes = filtered_df["Кузов"].value_counts()
-        kuzov_df = pd.DataFrame(kuzovtypes)
-        kuzov_df["Percentage"] = round((kuzov_df["count"] / kuzov_df["count"].sum()) * 100, 1)
-        g1.container(border=True).bar_chart(kuzovtypes, color="#3c324c")
-        g2.dataframe(kuzov_df)
-
-    #Year graphs
-    with chart_tabs[7]:
-        yeartypes = filtered_df["Год выпуска"].value_counts()
-        average_price_per_year_df = filtered_df.groupby("Год выпуска")["Цена"].mean().reset_index()
-
-        # Convert the "Цена" column (average price) to integers
-        average_price_per_year_df["Цена"] = average_price_per_year_df["Цена"].astype(int)
-        chart_tabs[7].container(border=True).bar_chart(yeartypes, color="#3c324c")
-        chart_tabs[7].dataframe(average_price_per_year_df, width=400)
-
-    #Коробка передач graphs
-    with chart_tabs[8]:
-        g1, g2 = chart_tabs[8].columns(2)
-        korobkatypes = filtered_df["Коробка передач"].value_counts()
-        korobka_df = pd.DataFrame(korobkatypes)
-        korobka_df["Percentage"] = round((korobka_df["count"] / korobka_df["count"].sum()) * 100, 1)
-        g1.container(border=True).bar_chart(korobkatypes, color="#3c324c")
-        g2.dataframe(korobka_df)
-
-    #Цвет graphs
-    with chart_tabs[9]:
-        g1, g2 = chart_tabs[9].columns(2)
-        colortypes = filtered_df["Цвет"].value_counts()
-        color_df = pd.DataFrame(colortypes)
-        color_df["Percentage"] = round((color_df["count"] / color_df["count"].sum()) * 100, 1)
-        g1.container(border=True).bar_chart(colortypes, color="#3c324c")
-        g2.dataframe(color_df)
-
-    #Объем двигателя graphs
-    with chart_tabs[10]:
-        volumetypes = filtered_df["Объем двигателя"].value_counts()
-        chart_tabs[10].container(border=True).area_chart(volumetypes, color="#3c324c")
+    # Only the selected section is computed, see sections.lazy_tabs
+    main_section, (main_tab1, main_tab2, main_tab3, main_tab4) = lazy_tabs(["📈Графики", "🗃Таблицы", "🧮 Сравнение", "📈Динамика Цен"], key="somon_section")
+
+    if main_section == 0:
+        chart_section, chart_tabs = lazy_tabs(["🏎️Модели", "📋Бренды", "⏲️Публикации", "👨‍💼Общее", "🛢️Вид топлива", "🏙️Города", "🚙Кузов", "📆Год выпуска", "⚙️Коробка передач", "🌈Цвет", "🛠️Объем двигателя"], key="somon_chart_section", parent=main_tab1)
+
+        #Модели graphs
+        if chart_section == 0:
+            modeltypes = counts("Модель")
+            # Sorted by views in descending order
+            brand_model_views = views("Модель")
+
+            chart_tabs[0].header("Cамые распространенные модели")
+            c1, c2 = chart_tabs[0].columns([3, 1])
+            c1.container(border=True).bar_chart(modeltypes.head(30), color="#3c324c")
+            c2.dataframe(modeltypes,width=400)
+            chart_tabs[0].header("Cамые просматриваемые модели")
+            c1, c2 = chart_tabs[0].columns([3, 1])
+            c1.container(border=True).bar_chart(brand_model_views.set_index("Модель").head(30), color="#3c324c")
+            c2.dataframe(brand_model_views, width=400)
+
+        #Brands graphs
+        if chart_section == 1:
+            modeltypes = counts("Марка")
+            # Sorted by views in descending order
+            brand_mark_views = views("Марка")
+            chart_tabs[1].header("Cамые распространенные модели")
+            c1, c2 = chart_tabs[1].columns([3, 1])
+            c1.container(border=True).bar_chart(modeltypes.head(30), color="#3c324c")
+            c2.dataframe(modeltypes,width=400)
+            chart_tabs[1].header("Cамые просматриваемые модели")
+            c1, c2 = chart_tabs[1].columns([3, 1])
+            c1.container(border=True).bar_chart(brand_mark_views.set_index("Марка").head(30), color="#3c324c")
+            c2.dataframe(brand_mark_views, width=400)
+
+        #Publications graphs
+        if chart_section == 2:
+            filtered_df["Дата публикации"] = pd.to_datetime(filtered_df["Дата публикации"], dayfirst=True)
+
+            # Extract just the date component
+            filtered_df["Дата публикации"] = filtered_df["Дата публикации"].dt.date
+            views_per_day = filtered_df.groupby("Дата публикации")["Просмотры"].sum().sort_values(ascending=False)
+
+            # Group by date and count the number of publications made on each day
+            publications_per_day = filtered_df.groupby("Дата публикации").size().sort_values(ascending=False)
+            chart_tabs[2].header("Количество заявок за последние 30 дней")
+            chart_tabs[2].area_chart(publications_per_day.head(30), color="#3c324c")
+            chart_tabs[2].header("Количество просмотров за последние 30 дней")
+            chart_tabs[2].area_chart(views_per_day.head(30), color="#3c324c")
+
+        #Общее graphs
+        if chart_section == 3:
+            top_authors, top_authors_df = top_sellers(filtered_df, df_sellers)
+            most_selling_models = sold_cells.groupby(["Модель"])["count"].sum().sort_values(ascending=False).head(30)
+            # Sales per day, the cells already hold the day as a string
+            month_sales = sold_cells.groupby(soldtime.DAY)["count"].sum().sort_index(ascending=False)
+            # Selling time of the most selling models, median and p90 are read from the binned times
+            model_times = soldtime.sold_time_stats(sold_cells, ["Модель"]).reindex(most_selling_models.index).dropna()
+            model_times = model_times.round(1).rename(columns={"count": "Продано", "mean": "Среднее, д",
+                                                               "median": "Медиана, д", "p90": "90%, д"})
+            # authors = top_authors["AuthorID"]
+            chart_tabs[3].header("Топ 30 самых активных продавцов")
+            c1, c2 = chart_tabs[3].columns([3, 1])
+            c1.container(border=True).bar_chart(top_authors, color="#3c324c")
+            c2.dataframe(top_authors_df, hide_index=True, width=400)
+            chart_tabs[3].header("Продажи за последние 30 дней")
+            chart_tabs[3].container(border=True).area_chart(month_sales, color="#3c324c")
+            chart_tabs[3].header("Топ 30 продаваемых моделей")
+            c1, c2 = chart_tabs[3].columns([3, 1])
+            c1.container(border=True).bar_chart(most_selling_models, color="#3c324c")
+            c2.dataframe(model_times, width=400)
+
+        #Fueltype graphs
+        if chart_section == 4:
+            g1, g2 = chart_tabs[4].columns([2,1])
+            fueltypes = counts("Вид топлива")
+            fuel_df = pd.DataFrame(fueltypes)
+            fuel_df["Percentage"] = round((fuel_df["count"] / fuel_df["count"].sum()) * 100, 1)
+            g1.container(border=True).bar_chart(fueltypes, color="#3c324c")
+            g2.dataframe(fuel_df)
+
+        #City graphs
+        if chart_section == 5:
+            citytypes = counts("Город")
+            chart_tabs[5].container(border=True).bar_chart(citytypes, color="#3c324c")
+
+        #Kuzov graphs
+        if chart_section == 6:
+            g1, g2 = chart_tabs[6].columns(2)
+            kuzovtypes = counts("Кузов")
+            kuzov_df = pd.DataFrame(kuzovtypes)
+            kuzov_df["Percentage"] = round((kuzov_df["count"] / kuzov_df["count"].sum()) * 100, 1)
+            g1.container(border=True).bar_chart(kuzovtypes, color="#3c324c")
+            g2.dataframe(kuzov_df)
+
+        #Year graphs
+        if chart_section == 7:
+            yeartypes = counts("Год выпуска")
+            average_price_per_year_df = mean_price("Год выпуска")
+
+            # Convert the "Цена" column (average price) to integers
+            average_price_per_year_df["Цена"] = average_price_per_year_df["Цена"].astype(int)
+            chart_tabs[7].container(border=True).bar_chart(yeartypes, color="#3c324c")
+            chart_tabs[7].dataframe(average_price_per_year_df, width=400)
+
+        #Коробка передач graphs
+        if chart_section == 8:
+            g1, g2 = chart_tabs[8].columns(2)
+            korobkatypes = counts("Коробка передач")
+            korobka_df = pd.DataFrame(korobkatypes)
+            korobka_df["Percentage"] = round((korobka_df["count"] / korobka_df["count"].sum()) * 100, 1)
+            g1.container(border=True).bar_chart(korobkatypes, color="#3c324c")
+            g2.dataframe(korobka_df)
+
+        #Цвет graphs
+        if chart_section == 9:
+            g1, g2 = chart_tabs[9].columns(2)
+            colortypes = counts("Цвет")
+            color_df = pd.DataFrame(colortypes)
+            color_df["Percentage"] = round((color_df["count"] / color_df["count"].sum()) * 100, 1)
+            g1.container(border=True).bar_chart(colortypes, color="#3c324c")
+            g2.dataframe(color_df)
+
+        #Объем двигателя graphs
+        if chart_section == 10:
+            volumetypes = counts("Объем двигателя")
+            chart_tabs[10].container(border=True).area_chart(volumetypes, color="#3c324c")
         
-    # Tables
-    c1, c2 = main_tab2.columns([2,1])
-    c1.dataframe(filtered_df[display_columns])
-    grouped_data = filtered_df.groupby(["Модель", "Марка"]).size().reset_index(name="Count")
-
-    # Display as a table
-    c2.dataframe(grouped_data, width=400)
-
-    #Comparison between different cars
-    car1_df = df_today.copy()
-    car2_df = df_today.copy()
-
-    compare_brand = main_tab3.columns(2)
-    compare_model = main_tab3.columns(2)
-
-    mark1 = compare_brand[0].multiselect("Выберите Марка", options=car1_df['Марка'].unique(), key="mark1_unique_key")
-    mark2 = compare_brand[1].multiselect("Выберите Марка", options=car2_df['Марка'].unique(), key="mark2_unique_key")
-    model1 = compare_model[0].multiselect("Выберите Модель", options=car1_df['Модель'].unique(), key="model1_unique_key")
-    model2 = compare_model[1].multiselect("Выберите Модель", options=car2_df['Модель'].unique(), key="model2_unique_key")
-    
-    filter1 = {"Марка": mark1, "Модель": model1}
-    filter2 = {"Марка": mark2, "Модель": model2}
-
-    for i in filter1.keys():
-        if filter1[i]:
-            car1_df = car1_df[car1_df[i].isin(filter1[i])]
-
-    for i in filter2.keys():
-        if filter2[i]:
-            car2_df = car2_df[car2_df[i].isin(filter2[i])]
-
-    comparison = main_tab3.columns(2)
-    with comparison[0]:
-        info = comparison[0].columns([3,3,4])
-        if len(car1_df) > 0:
-            price = round(car1_df["Цена"].mean())
-            count = len(car1_df)
-            prc = round(len(car1_df)/len(df_today)*100,1)
-        else:
-            price = 0
-            count = 0
-            prc = 0
-
-        info[0].container(border=True).metric("Количество", count)
-        info[1].container(border=True).metric("Охват", f'{prc}%')
-        info[2].container(border=True).metric("Цена", price)
-
-    with comparison[1]:
-        info = comparison[1].columns([3,3,4])
-        if len(car2_df) > 0:
-            price = round(car2_df["Цена"].mean())
-            count = len(car2_df)
-            prc = round(len(car2_df)/len(df_today)*100,2)
-        else:
-            price = 0
-            count = 0
-            prc = 0
-
-        info[0].container(border=True).metric("Количество", count)
-        info[1].container(border=True).metric("Охват", f'{prc}%')
-        info[2].container(border=True).metric("Цена", price)
-
-    comparison_views = main_tab3.columns(2)
-    views_total = df_today['Просмотры'].sum()
-    with comparison_views[0]:
-        info = comparison_views[0].columns([4,3,3])
-        info[0].container(border=True).metric("Просмотры", car1_df['Просмотры'].sum())
-        info[1].container(border=True).metric("Доля Просмотров", f"{round(car1_df['Просмотры'].sum()/views_total*100,2)}%")
-        info[2].container(border=True).metric("Просмотров на машину", round(car1_df['Просмотры'].sum()/len(car1_df['Просмотры']),2))
-    with comparison_views[1]:
-        info = comparison_views[1].columns([4,3,3])
-        info[0].container(border=True).metric("Просмотры", car2_df['Просмотры'].sum())
-        info[1].container(border=True).metric("Доля Просмотров", f"{round(car2_df['Просмотры'].sum()/views_total*100,2)}%")
-        info[2].container(border=True).metric("Просмотров на машину", round(car2_df['Просмотры'].sum()/len(car2_df['Просмотры']),2))
-
-    # compare graphs
-    compare_df = pd.concat([car2_df, car1_df]).drop_duplicates()[['Модель', 'Цена']]
+    if main_section == 1:
+        # Tables
+        # Only the visible page of each table is sent to the browser
+        c1, c2 = main_tab2.columns([2,1])
+        paged_table(filtered_df, "somon_listings", parent=c1, columns=display_columns)
+        grouped_data = filtered_df.groupby(["Модель", "Марка"]).size().reset_index(name="Count")
+
+        # Display as a table
+        paged_table(grouped_data, "somon_models", parent=c2, width=400)
+
+    if main_section == 2:
+        #Comparison between different cars
+        compare_brand = main_tab3.columns(2)
+        compare_model = main_tab3.columns(2)
+
+        marks = df_today['Марка'].unique()
+        models = df_today['Модель'].unique()
+        mark1 = compare_brand[0].multiselect("Выберите Марка", options=marks, key="mark1_unique_key")
+        mark2 = compare_brand[1].multiselect("Выберите Марка", options=marks, key="mark2_unique_key")
+        model1 = compare_model[0].multiselect("Выберите Модель", options=models, key="model1_unique_key")
+        model2 = compare_model[1].multiselect("Выберите Модель", options=models, key="model2_unique_key")
     
-    model_counts = compare_df["Модель"].value_counts().sort_values(ascending=False)
-    models_list = model_counts.index.tolist()[:6]
-
-    means = [np.mean(compare_df[compare_df['Модель'] == model]['Цена']) for model in models_list]
-    std_devs = [np.std(compare_df[compare_df['Модель'] == model]['Цена']) for model in models_list]
-
-    # Filter out numbers within 2 standard deviations from the mean
-    filtered_prices = []
-    max_len = max(len(compare_df[compare_df['Модель'] == model]['Цена']) for model in models_list)
-
-    for model, mean, std_dev in zip(models_list, means, std_devs):
-        model_prices = compare_df[compare_df['Модель'] == model]['Цена']
-        filtered_prices.append(model_prices[(model_prices >= mean - 2 * std_dev) & (model_prices <= mean + 2 * std_dev)].tolist())
-
-
-    fig = ff.create_distplot(
-            filtered_prices,
-            models_list,
-            show_curve=True,
-    )
-
-    for i in range(len(filtered_prices)):
-        fig.data[i].autobinx = True
-
-    main_tab3.header('Распределение цен')
-    main_tab3.plotly_chart(fig, use_container_width=True)
+        filter1 = {"Марка": mark1, "Модель": model1}
+        filter2 = {"Марка": mark2, "Модель": model2}
+
+        # Slicing the shared frame once per car instead of copying it first
+        car1_df = df_today[filter_mask(df_today, filter1, index, version)]
+        car2_df = df_today[filter_mask(df_today, filter2, index, version)]
+
+        comparison = main_tab3.columns(2)
+        with comparison[0]:
+            info = comparison[0].columns([3,3,4])
+            if len(car1_df) > 0:
+                price = round(car1_df["Цена"].mean())
+                count = len(car1_df)
+                prc = round(len(car1_df)/len(df_today)*100,1)
+            else:
+                price = 0
+                count = 0
+                prc = 0
+
+            info[0].container(border=True).metric("Количество", count)
+            info[1].container(border=True).metric("Охват", f'{prc}%')
+            info[2].container(border=True).metric("Цена", price)
+
+        with comparison[1]:
+            info = comparison[1].columns([3,3,4])
+            if len(car2_df) > 0:
+                price = round(car2_df["Цена"].mean())
+                count = len(car2_df)
+                prc = round(len(car2_df)/len(df_today)*100,2)
+            else:
+                price = 0
+                count = 0
+                prc = 0
+
+            info[0].container(border=True).metric("Количество", count)
+            info[1].container(border=True).metric("Охват", f'{prc}%')
+            info[2].container(border=True).metric("Цена", price)
+
+        comparison_views = main_tab3.columns(2)
+        views_total = df_today['Просмотры'].sum()
+        with comparison_views[0]:
+            info = comparison_views[0].columns([4,3,3])
+            info[0].container(border=True).metric("Просмотры", car1_df['Просмотры'].sum())
+            info[1].container(border=True).metric("Доля Просмотров", f"{round(car1_df['Просмотры'].sum()/views_total*100,2)}%")
+            info[2].container(border=True).metric("Просмотров на машину", round(car1_df['Просмотры'].sum()/len(car1_df['Просмотры']),2))
+        with comparison_views[1]:
+            info = comparison_views[1].columns([4,3,3])
+            info[0].container(border=True).metric("Просмотры", car2_df['Просмотры'].sum())
+            info[1].container(border=True).metric("Доля Просмотров", f"{round(car2_df['Просмотры'].sum()/views_total*100,2)}%")
+            info[2].container(border=True).metric("Просмотров на машину", round(car2_df['Просмотры'].sum()/len(car2_df['Просмотры']),2))
+
+        # compare graphs
+        # Union of the two selections, the rows of both cars are counted once
+        compare_df = df_today[filter_mask(df_today, filter1, index, version) |
+                              filter_mask(df_today, filter2, index, version)][["Модель", "Цена"]]
+        fig = price_distribution(version, filter1, filter2, compare_df)
+
+        main_tab3.header('Распределение цен')
+        main_tab3.plotly_chart(fig, use_container_width=True)
 
     #Динамика цен
-    with main_tab4:
-        df_price = pd.read_excel('Pricetags.xlsx')
-        df_price.rename(columns={"Unnamed: 0": "mark_model"}, inplace=True)
-        mark_model = (filtered_df['Марка'] + " " + filtered_df['Модель']).str.replace("  ", " ").unique()
+    if main_section == 3:
+        price_series = load_price_series(os.path.getmtime(PRICETAGS_PATH) if os.path.exists(PRICETAGS_PATH) else 0)
+        # Building the names from the distinct Mark/Model pairs instead of every row
+        pairs = filtered_df[['Марка', 'Модель']].drop_duplicates()
+        mark_model = (pairs['Марка'] + " " + pairs['Модель']).str.replace("  ", " ").unique()
         main_tab4.title("Динамика цен")
-        dates = df_price.columns[1:]
-        min_date = datetime.strptime(dates[0], '%d.%m.%Y')
-        max_date = datetime.strptime(dates[-1], '%d.%m.%Y')
 
-        if len(mark_model) <= 3:
+        if len(price_series.dates) == 0:
+            # The price matrix has no date columns until dbworker stores the first prices
+            main_tab4.warning('Нет данных о ценах')
+        elif len(mark_model) <= MAX_PRICE_MODELS:
+            min_date = pd.Timestamp(price_series.dates[0]).to_pydatetime()
+            max_date = pd.Timestamp(price_series.dates[-1]).to_pydatetime()
             c1, c2 = main_tab4.columns(2)
             date_start = c1.date_input('Начало:', value=min_date, min_value=min_date, max_value=max_date, format='DD.MM.YYYY')
             date_end = c2.date_input('Конец:', value=max_date, min_value=min_date, max_value=max_date, format='DD.MM.YYYY')
 
-            # Convert the selected dates to pandas Timestamp objects
-            date_start = pd.Timestamp(date_start)
-            date_end = pd.Timestamp(date_end)
-
-            # Filter columns based on the selected date range
-            df_price_columns = pd.to_datetime(df_price.columns[1:], format='%d.%m.%Y')
-            selected_columns = df_price.columns[1:][(df_price_columns >= date_start) & (df_price_columns <= date_end)]
-
-            # Select the columns from the DataFrame
-            selected_data = df_price[['mark_model'] +list(selected_columns)][df_price['mark_model'].isin(mark_model)]            
-
-            # Prepare the data for the line chart
+            # Slices of the price matrix, the date range is found by binary search on the sorted days
+            # (days without a price are left out, so the line connects the known prices)
             data = []
-            date_columns = selected_data.columns[1:]
-            for index, row in selected_data.iterrows():
-                model_prices = [row[col] for col in date_columns]
-                data.append(go.Line(x=date_columns, y=model_prices, mode='lines', name=row['mark_model']))
+            for name, dates, prices in price_series.series(mark_model, date_start, date_end):
+                data.append(go.Scatter(x=dates, y=prices, mode='lines', name=name))
 
             # Create the line chart
             fig = go.Figure(data=data)
@@ -445,7 +587,7 @@ def app(df_today, df_sold):
 
 
         else:
-            main_tab4.text('Пожалуйста выберите до 3 моделей')
+            main_tab4.text(f'Пожалуйста выберите до {MAX_PRICE_MODELS} моделей')
         # date_start = c1.date_input()
         # date_end = c2.date_input()
 
@@ -1,18 +1,23 @@
 import pandas as pd
 import streamlit as st
-from NewFilter import MyFilter
+from NewFilter import MyFilter, shared_index
+from sections import lazy_tabs
 
-def app(df_exracted):
-    df_exracted['Дата оформ.'] = pd.to_datetime(df_exracted['Дата оформ.'])
-
-
-    df_exracted['Month'] = df_exracted['Дата оформ.'].dt.strftime('%Y-%m')
+def app(df_exracted, version=None):
+    # 'Дата оформ.' is typed and 'Month' is added by dashboard_data.prepare_data
     filters_tamozhnya = [
             'mark',
             'страна отправления/ экспорта'
         ]
 
-    dynamic_filters_tamozhnya = MyFilter(df_exracted, filters_name=filters_tamozhnya)
+    if df_exracted is None:
+        # prepare_data returns no table when tamozhnya/extracted.xlsx is missing
+        st.warning('Нет данных таможни')
+        return
+
+    index = shared_index('extracted', version, filters_tamozhnya, df_exracted) if version is not None else None
+    dynamic_filters_tamozhnya = MyFilter(df_exracted, filters_name=filters_tamozhnya, index=index, version=version,
+                                         key='tamozhnya_filters')
     st.sidebar.header('Задайте фильтры:')
 
     # Adding all filters to sidebar
@@ -27,11 +32,14 @@ def app(df_exracted):
 
     date_start, date_end = pd.to_datetime(date_start), pd.to_datetime(date_end)
     #Applyting price and year filters to df
-    filtered_df = dynamic_filters_tamozhnya.filter()
-    filtered_df = filtered_df[
-            (filtered_df['Статистическая  стоимость '] >= price_from) & (filtered_df['Статистическая  стоимость '] <= price_till) &
-            (filtered_df['year'] >= year_range[0]) & (filtered_df['year'] <= year_range[1]) &
-            (filtered_df['Дата оформ.'] >= date_start) & (filtered_df['Дата оформ.'] <= date_end)]
+    price = df_exracted['Статистическая  стоимость ']
+    year = df_exracted['year']
+    date = df_exracted['Дата оформ.']
+    filtered_df = df_exracted[
+            dynamic_filters_tamozhnya.mask() &
+            ((price >= price_from) & (price <= price_till) &
+             (year >= year_range[0]) & (year <= year_range[1]) &
+             (date >= date_start) & (date <= date_end)).to_numpy()]
 
     # Tamozhnya tab
     col_tamozhnya = st.columns(5)
@@ -68,9 +76,10 @@ def app(df_exracted):
     with col_tamozhnya[4]:
         col_tamozhnya[4].container(border=True).metric('Отправители:', f"{exporters}")
 
-    tabs = st.tabs(['📋Бренды', '🏙️Страны', '📆Год выпуска', '👨‍💼Отправители', 'Импорт по месяцам'])
+    # Only the selected section is computed, see sections.lazy_tabs
+    section, tabs = lazy_tabs(['📋Бренды', '🏙️Страны', '📆Год выпуска', '👨‍💼Отправители', 'Импорт по месяцам'], key='tamozhnya_section')
 
-    with tabs[0]:
+    if section == 0:
         marktypes = filtered_df['mark'].value_counts().sort_values(ascending=False)
         total_tax_per_brand = filtered_df.groupby('mark')['total tax'].mean()
 
@@ -90,7 +99,7 @@ def app(df_exracted):
         c1.container(border=True).bar_chart(total_tax_per_brand.head(30), color='#3c324c')
         c2.dataframe(total_tax_per_brand,width=400)
 
-    with tabs[1]:
+    if section == 1:
         countrytypes = filtered_df['страна отправления/ экспорта'].value_counts().sort_values(ascending=False)
         total_tax_per_country = filtered_df.groupby('страна отправления/ экспорта')['total tax'].mean()
 
@@ -110,7 +119,7 @@ def app(df_exracted):
         c1.container(border=True).bar_chart(total_tax_per_country.head(30), color='#3c324c')
         c2.dataframe(total_tax_per_country,width=400)
 
-    with tabs[2]:
+    if section == 2:
         yeartypes = filtered_df['year'].value_counts().sort_values(ascending=False)
         total_tax_per_year = filtered_df.groupby('year')['total tax'].mean()
 
@@ -131,7 +140,7 @@ def app(df_exracted):
         c1.container(border=True).bar_chart(total_tax_per_year.head(30), color='#3c324c')
         c2.dataframe(total_tax_per_year,width=400)
     
-    with tabs[3]:
+    if section == 3:
         exporters = filtered_df['Отправитель/экспортер'].value_counts().sort_values(ascending=False)
 
         tabs[3].header('Самые активные экспортеры')
@@ -143,7 +152,7 @@ def app(df_exracted):
         # Display the dataframe in the second column
         tabs[3].dataframe(exporters_df)
 
-    with tabs[4]:
+    if section == 4:
         # Group by month and count occurrences
         months = filtered_df['Month'].value_counts().sort_index()
 
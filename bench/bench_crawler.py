@@ -0,0 +1,60 @@
+"""
+Compares the threads and async crawler engines against the local stub.
+
+    python bench/bench_crawler.py --pages 100 --latency 0.05
+    python bench/bench_crawler.py --pages 100 --cache
+
+With --cache every engine runs three times: a cold crawl filling the HTTP cache, a
+re-crawl revalidating it (304 answers, unchanged pages are not parsed) and an offline
+replay of the cache into a fresh database.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import serve  # noqa: E402
+from dbworker import CarMain  # noqa: E402
+
+
+def run(crawler, base_url, db_path, parser, parse_workers, cache=None, offline=False, rate=0):
+    collector = CarMain(db_path=db_path, base_url=base_url, crawler=crawler, parser=parser,
+                        parse_workers=parse_workers, cache=cache, offline=offline, rate=rate)
+    start = time.perf_counter()
+    collector.update()
+    elapsed = time.perf_counter() - start
+    cars = collector.store.count('today') + collector.store.count('sold')
+    collector.store.close()
+    return elapsed, cars
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--engines', nargs='+', default=['threads', 'async'])
+    parser.add_argument('--parser', default='auto', help='parser backend: auto, selectolax, lxml or bs4')
+    parser.add_argument('--parse-workers', type=int, default=0, help='parser processes, 0 parses in threads')
+    parser.add_argument('--cache', action='store_true', help='also measure re-crawl and offline replay')
+    parser.add_argument('--rate', type=float, default=0, help='requests per second, 0 is unlimited')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 429/503')
+    args = parser.parse_args()
+
+    server = serve(pages=args.pages, latency=args.latency, error_rate=args.error_rate)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in args.engines:
+            cache = os.path.join(tmp, f'{engine}_cache') if args.cache else None
+            runs = [('cold', f'{engine}.db', False)]
+            if args.cache:
+                runs += [('recrawl', f'{engine}.db', False), ('offline', f'{engine}_replay.db', True)]
+            for name, db_name, offline in runs:
+                server.requests = server.not_modified = 0
+                elapsed, cars = run(engine, base_url, os.path.join(tmp, db_name), args.parser,
+                                    args.parse_workers, cache, offline, args.rate)
+                print(f'{engine:>8} {name:>7}: {cars} cars, {server.requests} requests '
+                      f'({server.not_modified} not modified) in {elapsed:.1f}s')
+    server.shutdown()
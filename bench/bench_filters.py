@@ -0,0 +1,78 @@
+"""
+Measures one rerun of the cascading sidebar filters: the filtered frame plus the
+options of every filter given the others.
+
+    python bench/bench_filters.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from NewFilter import FilterIndex  # noqa: E402
+
+COLUMNS = {
+    'Марка': 60, 'Модель': 900, 'Город': 40, 'Кузов': 12, 'Вид топлива': 6,
+    'Привод': 4, 'Коробка передач': 3, 'Цвет': 20, 'Растаможен в РТ': 2, 'Состояние': 4,
+}
+
+
+def sample_frame(rows, seed=0):
+    # Skewed random categories, a few values are frequent like on the site
+    rng = np.random.default_rng(seed)
+    data = {}
+    for column, cardinality in COLUMNS.items():
+        weights = 1 / np.arange(1, cardinality + 1)
+        data[column] = pd.Series(rng.choice(cardinality, rows, p=weights / weights.sum())).map(
+            lambda i, c=column: f'{c} {i}')
+    data['Цена'] = rng.integers(1000, 500000, rows)
+    return pd.DataFrame(data)
+
+
+def old_rerun(df, selections):
+    # What MyFilter did before: a copy and chained isin masks for every filter
+    def filter_df(except_filter=None):
+        filtered_df = df.copy()
+        for key, values in selections.items():
+            if key != except_filter and values:
+                filtered_df = filtered_df[filtered_df[key].isin(values)]
+        return filtered_df
+    options = {column: filter_df(column)[column].unique().tolist() for column in selections}
+    return filter_df(), options
+
+
+def new_rerun(df, index, selections):
+    return df[index.mask(selections)], index.options(selections)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = sample_frame(args.rows)
+    selections = {column: [] for column in COLUMNS}
+    selections.update({'Марка': ['Марка 0', 'Марка 1', 'Марка 3'], 'Вид топлива': ['Вид топлива 0'],
+                       'Цвет': ['Цвет 0', 'Цвет 2']})
+
+    start = time.perf_counter()
+    index = FilterIndex(df, list(COLUMNS))
+    print(f'index build: {(time.perf_counter() - start) * 1000:7.1f} ms')
+
+    old_df, old_options = old_rerun(df, selections)
+    new_df, new_options = new_rerun(df, index, selections)
+    same = old_df.equals(new_df) and all(set(old_options[c]) == set(new_options[c]) for c in COLUMNS)
+    print(f'results: {"ok" if same else "MISMATCH"} ({len(new_df)} rows)')
+
+    for name, rerun in [('isin', lambda: old_rerun(df, selections)),
+                        ('index', lambda: new_rerun(df, index, selections))]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            rerun()
+        print(f'{name:>5}: {(time.perf_counter() - start) / args.repeat * 1000:7.1f} ms per rerun')
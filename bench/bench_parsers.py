@@ -0,0 +1,44 @@
+"""
+Measures detail page parsing speed of every installed parser backend.
+
+    python bench/bench_parsers.py --pages 2000
+    python bench/bench_parsers.py --fixture saved_page.html
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers  # noqa: E402
+from stub_server import load_fixture, render  # noqa: E402
+
+
+def sample_page():
+    # Rendering the saved detail page template the same way the stub server does
+    return render(load_fixture('detail.html'), name='Toyota Camry', year=2012, views=345, post_id=11432545,
+                  price='120 000', author_id=4617476, phone_class='phone-author').encode('utf-8')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--fixture', help='saved detail page (defaults to bench/fixtures/detail.html)')
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture, 'rb') as file:
+            content = file.read()
+    else:
+        content = sample_page()
+
+    reference = parsers.parse_detail(content, 'fixture', 'bs4')
+    for backend in parsers.available_backends():
+        result = parsers.parse_detail(content, 'fixture', backend)
+        status = 'ok' if result == reference else 'MISMATCH'
+        start = time.perf_counter()
+        for _ in range(args.pages):
+            parsers.parse_detail(content, 'fixture', backend)
+        elapsed = time.perf_counter() - start
+        print(f'{backend:>11}: {args.pages / elapsed:8.0f} pages/s ({status})')
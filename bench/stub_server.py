@@ -0,0 +1,152 @@
+"""
+Local HTTP stub of somon.tj used to benchmark the crawler offline.
+
+Listing pages and detail pages are rendered from the saved HTML templates in
+bench/fixtures, so CarMain can be pointed at http://127.0.0.1:<port> instead of
+https://somon.tj:
+
+    python bench/stub_server.py --port 8000 --pages 300 --latency 0.05
+"""
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGE_SIZE = 30  # Number of listings on one listing page
+FIRST_ID = 11500000  # PostID of the newest listing, older listings have smaller ids
+SOLD_EVERY = 17  # Every n-th listing is rendered as sold
+NAMES = ['Toyota Camry', 'Opel Astra', 'Mercedes-Benz E-Class', 'Hyundai Sonata', 'ВАЗ 2107', 'Land Rover Range Rover']
+
+
+def load_fixture(name, fixtures=FIXTURES):
+    with open(os.path.join(fixtures, name), encoding='utf-8') as file:
+        return file.read()
+
+
+def render(template, **values):
+    # Replacing {{key}} placeholders of a saved page
+    for key, value in values.items():
+        template = template.replace('{{' + key + '}}', str(value))
+    return template
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real site
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)  # Simulating network round trip
+        url = urlsplit(self.path)
+        with server.lock:
+            server.requests += 1
+        if server.error_rate and random.random() < server.error_rate:
+            # Simulating an overloaded site that limits the crawler
+            self.send_response(random.choice([429, 503]))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if url.path.startswith('/transport/'):
+            page = int(parse_qs(url.query).get('page', ['1'])[0])
+            body = self.listing(page)
+        elif url.path.startswith('/adv/'):
+            post_id = int(url.path.split('/adv/')[1].split('_')[0])
+            body = self.detail(post_id)
+        else:
+            body = None
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = body.encode('utf-8')
+        # Answering revalidation requests like the real site, the ETag is the body hash
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            with server.lock:
+                server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def listing(self, page):
+        server = self.server
+        if page < 1 or page > server.pages:
+            return None
+        first = server.first_id - (page - 1) * PAGE_SIZE
+        items = '\n'.join(
+            f'    <div class="list-announcement js-item-listing"><a href="/adv/{post_id}_car-{post_id}/">'
+            f'{NAMES[post_id % len(NAMES)]}</a></div>'
+            for post_id in range(first, first - PAGE_SIZE, -1))
+        pages = '\n'.join(f'    <a class="page-number" href="?page={i}">{i}</a>'
+                          for i in sorted({1, page, server.pages}))
+        return render(server.listing_template, items=items, pages=pages)
+
+    def detail(self, post_id):
+        server = self.server
+        sold = post_id % SOLD_EVERY == 0
+        phone_class = 'phone-author phone-author--sold phone-author--toggled' if sold else 'phone-author'
+        # Every revision adds views to all listings and lowers the price of every fifth one
+        views = post_id % 1000 + server.revision * 25
+        price = 10000 + post_id % 300 * 1000 - (server.revision * 500 if post_id % 5 == 0 else 0)
+        return render(server.detail_template, name=NAMES[post_id % len(NAMES)], year=2000 + post_id % 24,
+                      views=views, post_id=post_id, price=price,
+                      author_id=post_id % 5000, phone_class=phone_class)
+
+    def log_message(self, format, *args):
+        pass  # Keeping benchmark output clean
+
+
+def serve(port=0, pages=100, latency=0.0, first_id=FIRST_ID, fixtures=FIXTURES, error_rate=0.0):
+    """
+    Starts the stub in a background thread.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        Running server, its address is f'http://127.0.0.1:{server.server_port}'.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.pages = pages
+    server.latency = latency
+    server.error_rate = error_rate  # Share of requests answered with 429/503
+    server.revision = 0  # Increase to change views and prices of the detail pages
+    server.first_id = first_id
+    server.requests = 0
+    server.not_modified = 0  # Requests answered with 304
+    server.lock = threading.Lock()
+    server.listing_template = load_fixture('listing.html', fixtures)
+    server.detail_template = load_fixture('detail.html', fixtures)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve saved somon.tj pages locally')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--fixtures', default=FIXTURES)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 429/503')
+    args = parser.parse_args()
+    server = serve(args.port, args.pages, args.latency, fixtures=args.fixtures, error_rate=args.error_rate)
+    print(f'Serving on http://127.0.0.1:{server.server_port}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,184 @@
+import asyncio  # Importing asyncio for the event loop and queues
+import logging  # Importing logging for logging errors and warnings
+import time  # Importing time library for timing operations
+
+import aiohttp  # Importing aiohttp for asynchronous HTTP requests
+
+from fetcher import Fetcher  # Importing the shared rate limiting and retry policy
+
+
+CONNECTION_LIMIT = 64  # Maximum number of open connections in the pool
+PER_HOST_LIMIT = 32  # Maximum number of simultaneous connections to one host
+LISTING_CONCURRENCY = 16  # Number of listing pages fetched at the same time
+DETAIL_WORKERS = 32  # Number of workers fetching detail pages
+QUEUE_SIZE = 1000  # Maximum number of detail links waiting in the queue
+REQUEST_TIMEOUT = 30  # Total timeout of one request in seconds
+
+
+class AsyncCrawler:
+    """
+    Asyncio crawler that streams listing pages into detail page fetches.
+
+    ...
+
+    Attributes
+    ----------
+    url : str
+        Listing URL ending with "?page=", the page number is appended to it.
+    parse_page_count : callable
+        Function returning the number of listing pages from the first page content.
+    parse_links : callable
+        Function returning the detail links found on a listing page content.
+    cache : HttpCache, optional
+        Response cache, requests are revalidated through it (or replayed from it offline).
+    fetcher : Fetcher, optional
+        Rate limiting, adaptive concurrency and retry policy shared with the other engines.
+
+    Methods
+    -------
+    run(should_fetch=None, on_detail=None, stop_after=None):
+        Crawls the listing pages and, optionally, the detail pages of the links they contain.
+    """
+
+    def __init__(self, url, parse_page_count, parse_links, limit=CONNECTION_LIMIT,
+                 limit_per_host=PER_HOST_LIMIT, listing_concurrency=LISTING_CONCURRENCY,
+                 detail_workers=DETAIL_WORKERS, cache=None, fetcher=None):
+        self.url = url
+        self.parse_page_count = parse_page_count
+        self.parse_links = parse_links
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.listing_concurrency = listing_concurrency
+        self.detail_workers = detail_workers
+        self.cache = cache
+        self.fetcher = fetcher or Fetcher()
+
+    async def request(self, session, url):
+        # Sending one GET, through the HTTP cache when there is one, returns (content, changed)
+        # or None for a page missing from the cache in offline mode
+        if self.cache is not None:
+            return await self.cache.aget(session, url)
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return await response.read(), True
+
+    async def fetch(self, session, url):
+        # Fetching one page under the fetch policy, returns (content, changed) or None when it failed
+        try:
+            return await self.fetcher.acall(lambda page_url: self.request(session, page_url), url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f'Failed to fetch: {url} - {e}')
+            return None
+
+    async def crawl(self, should_fetch=None, on_detail=None, stop_after=None):
+        """
+        Runs the listing -> detail pipeline.
+
+        Parameters
+        ----------
+        should_fetch: callable, optional
+            Called with every found link, the detail page is fetched only if it returns True.
+            When None, no detail pages are fetched.
+        on_detail: callable, optional
+            Called as on_detail(link, content, changed) for every fetched detail page, changed
+            is False when the cache revalidated an unchanged page. It runs in the default
+            thread pool so parsing does not stall the event loop.
+        stop_after: int, optional
+            Delta crawl: pages are walked newest-first in windows of this size and the crawl
+            stops once this many pages in a row had no link accepted by should_fetch.
+
+        Returns
+        -------
+        tuple
+            (links, failed_pages) - all links found on listing pages and the numbers of
+            listing pages that could not be fetched.
+        """
+        loop = asyncio.get_running_loop()
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        links = []
+        failed_pages = []
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)  # Bounded, so listing pages wait for slow detail workers
+        listing_semaphore = asyncio.Semaphore(self.listing_concurrency)
+        fetch_details = should_fetch is not None and on_detail is not None
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+
+            async def listing(page, content=None):
+                # Fetching a listing page and putting the unknown links into the queue,
+                # returns the number of queued links or None if the page failed
+                if content is None:
+                    async with listing_semaphore:
+                        result = await self.fetch(session, f'{self.url}{page}')
+                    if result is None:
+                        failed_pages.append(page)
+                        return None
+                    content = result[0]
+                try:
+                    page_links = self.parse_links(content)
+                except Exception as e:
+                    logging.error(f'Error accessing page: {page} - {str(e)}')
+                    failed_pages.append(page)
+                    return None
+                links.extend(page_links)
+                logging.info(f'Completed getting links from page {page}/{page_num}')
+                queued = 0
+                if fetch_details:
+                    for link in page_links:
+                        if should_fetch(link):
+                            queued += 1
+                            await queue.put(link)
+                return queued
+
+            async def detail_worker():
+                # Fetching detail pages from the queue until the stop marker arrives
+                while True:
+                    link = await queue.get()
+                    if link is None:
+                        break
+                    result = await self.fetch(session, link)
+                    if result is not None:
+                        try:
+                            await loop.run_in_executor(None, on_detail, link, *result)
+                        except Exception as e:
+                            logging.error(f'Error accessing page: {link}-{e}')
+
+            # Fetching the first page to determine the total number of pages
+            first_page = await self.fetch(session, f'{self.url}1')
+            if first_page is None:
+                raise ValueError('Unable to fetch the first listing page')
+            first_page = first_page[0]
+            page_num = self.parse_page_count(first_page)
+
+            workers = [asyncio.create_task(detail_worker()) for _ in range(self.detail_workers)] if fetch_details else []
+
+            if stop_after and fetch_details:
+                # Walking the pages newest-first until stop_after pages in a row held only known cars
+                known_run = 0
+                page = 1
+                while page <= page_num and known_run < stop_after:
+                    window = range(page, min(page + stop_after, page_num + 1))
+                    queued = await asyncio.gather(*(listing(i, first_page if i == 1 else None) for i in window))
+                    for count in queued:
+                        known_run = known_run + 1 if count == 0 else 0
+                        if known_run >= stop_after:
+                            break
+                    page += len(window)
+                logging.info(f'Delta crawl stopped at page {page - 1}/{page_num}')
+            else:
+                await asyncio.gather(listing(1, first_page), *(listing(page) for page in range(2, page_num + 1)))
+
+            # Stopping the workers once all queued links are processed
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        return links, failed_pages
+
+    def run(self, should_fetch=None, on_detail=None, stop_after=None):
+        # Running the crawl in a new event loop and logging how long it took
+        start = time.perf_counter()
+        links, failed_pages = asyncio.run(self.crawl(should_fetch, on_detail, stop_after))
+        logging.info(f'AsyncCrawler: {len(links)} links, {len(failed_pages)} failed pages '
+                     f'in {time.perf_counter() - start:.1f}s')
+        return links, failed_pages
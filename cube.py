@@ -0,0 +1,122 @@
+import logging  # Importing logging for logging the cube size
+import time  # Importing time library for timing the build
+
+import numpy as np  # Importing numpy for the roll-ups
+import pandas as pd  # Importing pandas library for data manipulation
+
+from NewFilter import FilterIndex
+
+
+# Dimensions of the SomonTJ cube: the sidebar filters plus the chart-only columns
+DIMENSIONS = ['Марка', 'Модель', 'Город', 'Кузов', 'Вид топлива', 'Привод', 'Коробка передач', 'Цвет',
+              'Растаможен в РТ', 'Состояние', 'Год выпуска', 'Объем двигателя']
+PRICE = 'Цена'
+VIEWS = 'Просмотры'
+MEASURE_NAMES = {'count': 'count', 'views': VIEWS, 'price_sum': PRICE, 'price_count': 'price_count'}
+
+
+class Cube:
+    """
+    Pre-aggregated listings for the chart tabs.
+
+    ...
+
+    The rows are grouped once by every combination of the dimensions that occurs
+    (a cell), with the number of listings, the sum of views and the sum and count of
+    prices per cell. A chart is a roll-up of the cells to one dimension under the
+    current filters, so its cost depends on the number of cells, not on the rows.
+
+    Attributes
+    ----------
+    dimensions : list
+        Grouping columns.
+    cells : pd.DataFrame
+        One row per cell: the dimensions, count, views, price_sum and price_count.
+    index : FilterIndex
+        Codes of the cells for every dimension.
+
+    Methods
+    -------
+    mask(selections, ranges=None):
+        Returns the boolean mask of the cells matching the filters.
+    counts(dimension, mask):
+        Number of listings per value, like value_counts().
+    sums(dimension, mask, measure='views'):
+        Sum of a measure per value.
+    mean_price(dimension, mask):
+        Average price per value.
+    """
+
+    def __init__(self, df, dimensions=DIMENSIONS):
+        start = time.perf_counter()
+        self.dimensions = [d for d in dimensions if d in df.columns]
+        price = pd.to_numeric(df[PRICE], errors='coerce')
+        measures = pd.DataFrame({
+            'count': np.ones(len(df), dtype=np.int64),
+            'views': pd.to_numeric(df[VIEWS], errors='coerce').fillna(0).to_numpy(dtype=np.int64),
+            'price_sum': price.fillna(0).to_numpy(),
+            'price_count': price.notna().to_numpy(dtype=np.int64),
+        })
+        keys = [df[d].reset_index(drop=True) for d in self.dimensions]
+        self.cells = measures.groupby(keys, dropna=False, sort=False).sum().reset_index()
+        self.index = FilterIndex(self.cells, self.dimensions)
+        self.measures = {measure: self.cells[measure].to_numpy() for measure in MEASURE_NAMES}
+        logging.info(f'Cube of {len(df)} rows: {len(self.cells)} cells in {time.perf_counter() - start:.2f}s')
+
+    def mask(self, selections, ranges=None):
+        """
+        Finds the cells matching the filters.
+
+        Parameters
+        ----------
+        selections : dict
+            Dimension -> list of selected values, an empty list selects everything.
+        ranges : dict, optional
+            Dimension -> (low, high), inclusive bounds of a numeric dimension.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the cells.
+        """
+        mask = self.index.mask(selections)
+        for dimension, (low, high) in (ranges or {}).items():
+            values = pd.to_numeric(pd.Series(self.index.values[dimension]), errors='coerce').to_numpy()
+            # Missing values never fall in a range, like the row filter
+            lookup = (values >= low) & (values <= high)
+            mask &= lookup[self.index.codes[dimension]]
+        return mask
+
+    def rollup(self, dimension, mask, measure):
+        # Summing a measure of the selected cells per value of the dimension
+        codes = self.index.codes[dimension][mask]
+        weights = self.measures[measure][mask]
+        totals = np.bincount(codes, weights=weights, minlength=len(self.index.values[dimension]))
+        # bincount sums in float64, integer measures are returned as integers again
+        totals = totals.astype(weights.dtype)
+        values = self.index.values[dimension]
+        # Missing values are left out, like value_counts() and groupby() do
+        present = ~pd.isna(values)
+        return pd.Series(totals[present], index=pd.Index(values[present], name=dimension).infer_objects(),
+                         name=MEASURE_NAMES[measure])
+
+    def counts(self, dimension, mask):
+        # Number of listings per value, sorted like value_counts()
+        counts = self.rollup(dimension, mask, 'count')
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+    def sums(self, dimension, mask, measure='views'):
+        # Sum of a measure per value present under the filters, largest first
+        counts = self.rollup(dimension, mask, 'count')
+        sums = self.rollup(dimension, mask, measure)[counts > 0]
+        return sums.sort_values(ascending=False, kind='stable')
+
+    def mean_price(self, dimension, mask):
+        # Average price per value, sorted by value like groupby().mean()
+        priced = self.rollup(dimension, mask, 'price_count')
+        sums = self.rollup(dimension, mask, 'price_sum')
+        return (sums[priced > 0] / priced[priced > 0]).sort_index().rename(PRICE)
+
+    def total(self, mask, measure='count'):
+        # Total of a measure over the selected cells
+        return self.measures[measure][mask].sum()
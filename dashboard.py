@@ -7,48 +7,65 @@ import yaml
 from yaml.loader import SafeLoader
 from datetime import datetime, timedelta
 import logging
+import os
 import SomonTJ, Tamozhnya 
+import snapshot
+import dashboard_data
+from dashboard_data import prepare_data
+from NewFilter import filter_mask
 
 st.set_page_config(page_title='Коиноти Нав', page_icon=':bar_chart', layout='wide',)
 
-@st.cache_data # Cache the original DataFrame
-def load_data():
-    # Get today's date
-    current_date = datetime.now().date()
-
-    # Define the maximum number of days to go back in search
-    max_days_back = 7
+@st.cache_resource # One store per process, shared by all sessions
+def data_store():
+    return dashboard_data.DataStore(load_data, data_version)
 
+def export_files(max_days_back=7):
+    # Today's and sold xlsx exports of the last days, newest first
+    current_date = datetime.now().date()
     for i in range(max_days_back):
-        # Generate file names based on the current date
         current_file_date = (current_date - timedelta(days=i)).strftime('%Y-%m-%d')
-        today_file = f'export/ttoday_{current_file_date}.xlsx'
-        sold_file = f'export/sold_{current_file_date}.xlsx'
+        yield f'export/ttoday_{current_file_date}.xlsx', f'export/sold_{current_file_date}.xlsx'
+
+def mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+def data_version():
+    # The mtimes of every source load_data may read, so a new snapshot or xlsx export
+    # reloads the data when the prebuilt artifact is missing, not only a new build
+    sources = [snapshot.manifest_path(), 'links.xlsx']
+    for today_file, sold_file in export_files():
+        sources += [today_file, sold_file]
+    return (dashboard_data.artifact_version(),) + tuple(mtime(path) for path in sources)
+
+def load_data():
+    # Open the tables prebuilt by dbworker, memory-mapped and already joined and typed
+    frames = dashboard_data.load()
+    if frames is not None:
+        return frames
+
+    # Load the newest parquet snapshot listed in export/manifest.json
+    tables = snapshot.load_snapshot()
+    if tables is not None:
+        return prepare_data(tables['today'], tables['sold'], tables['links'])
+
+    # Fall back to the old xlsx exports of the last week
+    for today_file, sold_file in export_files():
         try:
             # Attempt to load the files
             df_today = pd.read_excel(today_file)
             df_sold = pd.read_excel(sold_file)
-
-            # Convert columns to appropriate data types
-            df_today['AuthorID'] = pd.to_numeric(df_today['AuthorID'], errors='coerce')
-            df_today = df_today[(df_today["Price"] >= 1000) & (df_today["Price"] <= 5000000)]
-            df_sold['DatePublished'] = pd.to_datetime(df_sold['DatePublished'], format='%d.%m.%Y %H:%M')
-            df_sold['sold_date'] = pd.to_datetime(df_sold['sold_date'], format='%d.%m.%Y %H:%M')
-
-            # Calculate the time taken to sell each model in hours
-            df_sold['selling_time_hours'] = round((df_sold['sold_date'] - df_sold['DatePublished']).dt.total_seconds() / 86400, 2) 
             df_link = pd.read_excel('links.xlsx')
-            merged_df = pd.merge(df_today, df_link, on='PostID', how='left')
-            exctracted = pd.read_excel('tamozhnya/extracted.xlsx')
-            exctracted['year'] = exctracted['year'].fillna(0).astype(int)
-            exctracted['year'] = exctracted['year'].astype(int)
 
-            return merged_df, df_sold, exctracted
+            return prepare_data(df_today, df_sold, df_link)
         except FileNotFoundError:
             pass  # Continue to the next date if files are not found
 
     print("No files found within the specified date range.")
-    return None, None, None
+    return None, None, None, None, None
 
 def filter_dataframe(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
     """
@@ -69,13 +86,8 @@ def filter_dataframe(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
         The filtered pandas dataframe.
 
     """
-    filtered_df = df.copy()  # Create a copy of the original DataFrame to avoid modifying it directly
-    # Apply filters to the DataFrame
-    for column, values in filters.items():
-        if values:  # Check if the list of values for the current column is not empty
-            filtered_df = filtered_df[filtered_df[column].isin(values)]
-    
-    return filtered_df
+    # One boolean mask over the original DataFrame, it is sliced once instead of copied and sliced per column
+    return df[filter_mask(df, filters)]
 
 
 class Myfilter:
@@ -101,11 +113,7 @@ class Myfilter:
                 copy_filters[key] = []
 
     def filter(self):
-        filtered_df = self.df.copy()
-        for key, values in st.session_state[self.filters_name].items():
-            if values:
-                filtered_df = filtered_df[filtered_df[key].isin(values)]
-        return filtered_df
+        return self.df[filter_mask(self.df, st.session_state[self.filters_name])]
     
     
 class Dashboard:
@@ -219,7 +227,8 @@ class Dashboard:
         })
 
     def display_dashboard(self):
-        df_today, df_sold, df_exracted = load_data()
+        # Shallow copies of the shared tables, the store reloads them when dbworker builds new ones
+        version, (df_today, df_sold, df_exracted, df_sold_time, df_sellers) = data_store().get()
         with st.sidebar:
             app = option_menu(
                 menu_title='Menu',
@@ -243,7 +252,7 @@ class Dashboard:
 
             st.session_state['filters'] = copy_filters
             print('SomonTJ', st.session_state['filters'])
-            SomonTJ.app(df_today, df_sold)
+            SomonTJ.app(df_today, df_sold, version, df_sold_time, df_sellers)
 
         if app == 'Таможня':
             copy_filters = st.session_state['filters'].copy()
@@ -257,7 +266,7 @@ class Dashboard:
                     
             st.session_state['filters'] = copy_filters
             print('Таможня', st.session_state['filters'])
-            Tamozhnya.app(df_exracted)
+            Tamozhnya.app(df_exracted, version)
     
     def run(self):
 
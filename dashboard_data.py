@@ -0,0 +1,274 @@
+import json  # Importing json for the artifact metadata
+import logging  # Importing logging for logging build events
+import os
+import threading  # Importing threading for the background reload
+import time  # Importing time library for timing the build
+
+import pandas as pd  # Importing pandas library for data manipulation
+import pyarrow as pa  # Importing pyarrow for the Arrow IPC files
+from pyarrow import ipc
+
+from normalize import parse_dates
+import snapshot
+import soldtime
+
+
+ARTIFACT_DIR = os.path.join(snapshot.SNAPSHOT_DIR, 'dashboard')  # Directory of the prebuilt dashboard tables
+META = 'meta.json'  # Build time, source snapshot and row counts of the artifact
+EXTRACTED_PATH = 'tamozhnya/extracted.xlsx'  # Customs declarations shown on the "Таможня" page
+TABLES = ['today', 'sold', 'extracted', 'sold_time', 'sellers']  # Tables of the artifact, in the order load_data returns them
+MIN_PRICE = 1000  # Listings outside this price range are left out of the dashboard
+MAX_PRICE = 5000000
+RELOAD_INTERVAL = 60  # Seconds between two checks for a new build
+
+
+def seller_table(df_today, df_sold):
+    # Sellers like ListingStore.read_sellers, for exports without the store's table
+    listings = pd.concat([df_today[['AuthorID', 'AuthorName', 'PostID']], df_sold[['AuthorID', 'AuthorName', 'PostID']]])
+    listings = listings.dropna(subset=['AuthorID'])
+    # The name of the newest listing of every seller
+    names = listings.sort_values('PostID').drop_duplicates('AuthorID', keep='last').set_index('AuthorID')['AuthorName']
+    sellers = df_today.groupby('AuthorID').agg(listings=('PostID', 'size'), price_sum=('Price', 'sum'),
+                                               price_count=('Price', 'count'))
+    sellers = sellers.reindex(names.index, fill_value=0)
+    sellers.insert(0, 'AuthorName', names)
+    sellers.insert(2, 'sold', df_sold.groupby('AuthorID').size().reindex(names.index, fill_value=0))
+    return sellers.reset_index()
+
+
+def prepare_data(df_today, df_sold, df_link, df_extracted=None, df_sold_time=None, df_sellers=None):
+    """
+    Turns the exported tables into the frames the dashboard pages work with.
+
+    Parameters
+    ----------
+    df_today: pd.DataFrame
+        Listings on the site.
+    df_sold: pd.DataFrame
+        Sold listings with sold_date.
+    df_link: pd.DataFrame
+        PostID and Link of the listings.
+    df_extracted: pd.DataFrame, optional
+        Customs declarations, read from EXTRACTED_PATH by default.
+    df_sold_time: pd.DataFrame, optional
+        Selling time cells kept by the store, computed from df_sold by default.
+    df_sellers: pd.DataFrame, optional
+        Sellers kept by the store, computed from df_today and df_sold by default.
+
+    Returns
+    -------
+    tuple
+        (today joined with the links, sold with selling_time_hours, customs declarations or None,
+        selling time cells, sellers).
+    """
+    # Convert columns to appropriate data types
+    df_today['AuthorID'] = pd.to_numeric(df_today['AuthorID'], errors='coerce')
+    if df_sellers is None:
+        # Counted before the price range is applied, like the store counts them
+        df_sellers = seller_table(df_today, df_sold)
+    df_today = df_today[(df_today["Price"] >= MIN_PRICE) & (df_today["Price"] <= MAX_PRICE)]
+    df_sold['DatePublished'] = parse_dates(df_sold['DatePublished'])
+    df_sold['sold_date'] = parse_dates(df_sold['sold_date'])
+
+    # Calculate the time taken to sell each model in days
+    df_sold['selling_time_hours'] = round((df_sold['sold_date'] - df_sold['DatePublished']).dt.total_seconds() / 86400, 2)
+    merged_df = pd.merge(df_today, df_link, on='PostID', how='left')
+    if df_sold_time is None:
+        # Exports without the store's table (snapshots, workbooks) are grouped here once
+        df_sold_time = soldtime.sold_time_cells(df_sold)
+
+    if df_extracted is None and os.path.exists(EXTRACTED_PATH):
+        df_extracted = pd.read_excel(EXTRACTED_PATH)
+    if df_extracted is not None:
+        df_extracted['year'] = df_extracted['year'].fillna(0).astype(int)
+        df_extracted['Дата оформ.'] = pd.to_datetime(df_extracted['Дата оформ.'])
+        df_extracted['Month'] = df_extracted['Дата оформ.'].dt.strftime('%Y-%m')
+    else:
+        logging.warning(f'{EXTRACTED_PATH} not found, the customs page has no data')
+
+    return merged_df, df_sold, df_extracted, df_sold_time, df_sellers
+
+
+def _write_table(df, path):
+    # Writing an uncompressed Arrow IPC file, so it can be memory-mapped instead of decoded
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path + '.tmp', 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + '.tmp', path)
+
+
+def build(tables=None, source=None, directory=ARTIFACT_DIR):
+    """
+    Builds the dashboard artifact from the newest snapshot, run by dbworker after export().
+
+    Parameters
+    ----------
+    tables: dict, optional
+        'today', 'sold', 'links' and optionally 'sold_time' and 'sellers' frames, the newest snapshot
+        is loaded by default.
+    source: str, optional
+        Date of the snapshot the given tables were written to, recorded in the metadata.
+    directory: str
+        Output directory of the Arrow files and the metadata.
+
+    Returns
+    -------
+    dict or None
+        Metadata of the artifact, None when there is no snapshot to build from.
+    """
+    start = time.perf_counter()
+    if tables is None:
+        manifest = snapshot.read_manifest()['snapshots']
+        tables = snapshot.load_snapshot()
+        if tables is None:
+            logging.warning('No snapshot to build the dashboard data from')
+            return None
+        source = manifest[-1]['date']
+    else:
+        # The caller's frames are typed in place by prepare_data
+        tables = {name: df.copy() for name, df in tables.items()}
+    frames = prepare_data(tables['today'], tables['sold'], tables['links'], df_sold_time=tables.get('sold_time'),
+                          df_sellers=tables.get('sellers'))
+
+    os.makedirs(directory, exist_ok=True)
+    meta = {'built_at': pd.Timestamp.now().isoformat(timespec='seconds'), 'snapshot': source, 'rows': {}}
+    for name, df in zip(TABLES, frames):
+        path = os.path.join(directory, f'{name}.arrow')
+        if df is None:
+            # Dropping a table of an earlier build, it would not match this one
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        _write_table(snapshot.decode_columns(df), path)
+        meta['rows'][name] = len(df)
+
+    # The metadata is replaced last, its mtime tells the dashboard that a new build is complete
+    tmp = os.path.join(directory, META + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(directory, META))
+    logging.info(f'Dashboard data built in {time.perf_counter() - start:.1f}s: {meta["rows"]}')
+    return meta
+
+
+def artifact_version(directory=ARTIFACT_DIR):
+    # Returning the mtime of the metadata, 0 when the artifact was never built
+    try:
+        return os.path.getmtime(os.path.join(directory, META))
+    except OSError:
+        return 0
+
+
+def load(directory=ARTIFACT_DIR):
+    """
+    Opens the prebuilt dashboard tables.
+
+    The Arrow files are memory-mapped and converted one column per block, so the
+    numeric columns without nulls stay views of the mapping instead of copies, only
+    strings and dates become Python objects, and a cold start does not read any workbook.
+
+    Parameters
+    ----------
+    directory: str
+        Directory written by build().
+
+    Returns
+    -------
+    tuple or None
+        (df_today, df_sold, df_extracted, df_sold_time, df_sellers) like prepare_data, None when the
+        artifact is missing.
+    """
+    try:
+        with open(os.path.join(directory, META), encoding='utf-8') as file:
+            meta = json.load(file)
+    except FileNotFoundError:
+        return None
+    frames = []
+    for name in TABLES:
+        if name not in meta['rows']:
+            frames.append(None)
+            continue
+        with pa.memory_map(os.path.join(directory, f'{name}.arrow')) as source:
+            # The Arrow table is released column by column while it is converted
+            table = ipc.open_file(source).read_all()
+            frames.append(table.to_pandas(split_blocks=True, self_destruct=True))
+            del table
+    return tuple(frames)
+
+
+class DataStore:
+    """
+    Read-only dashboard tables shared by all sessions of the Streamlit process.
+
+    ...
+
+    One copy of every table is held per data version. A daemon thread checks the
+    version every interval seconds and loads a new build next to the old one, then
+    swaps them in a single assignment, so sessions are never blocked by a reload
+    and a session always sees the tables of one version.
+
+    Attributes
+    ----------
+    loader : callable
+        Returns (df_today, df_sold, df_extracted, df_sold_time, df_sellers) of the current data.
+    version : callable
+        Returns the current data version, e.g. the mtime of the artifact.
+    interval : float
+        Seconds between two version checks.
+
+    Methods
+    -------
+    get():
+        Returns (version, frames) of the loaded data.
+    reload():
+        Loads the data again if its version changed.
+    """
+
+    def __init__(self, loader, version=artifact_version, interval=RELOAD_INTERVAL):
+        self.loader = loader
+        self.version = version
+        self.interval = interval
+        self.lock = threading.Lock()  # Only one reload at a time
+        self.current = (None, (None,) * len(TABLES))
+        self.reload()
+        threading.Thread(target=self.watch, daemon=True).start()
+
+    def reload(self):
+        # Loading the data when its version changed, returns True if the tables were replaced
+        with self.lock:
+            version = self.version()
+            if version == self.current[0]:
+                return False
+            start = time.perf_counter()
+            frames = self.loader()
+            if frames is None:
+                return False
+            self.current = (version, tuple(frames))
+        logging.info(f'Dashboard data version {version} loaded in {time.perf_counter() - start:.2f}s')
+        return True
+
+    def watch(self):
+        # Checking for a new build until the process exits
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.reload()
+            except Exception as e:
+                # A half written or broken build keeps the previous version in use
+                logging.error(f'Error reloading the dashboard data: {str(e)}')
+
+    def get(self):
+        """
+        Returns the loaded tables.
+
+        The frames are shallow copies: they share the column data with the store, so
+        they cost nothing, and renaming or adding columns does not change the store.
+
+        Returns
+        -------
+        tuple
+            (version, (df_today, df_sold, df_extracted, df_sold_time, df_sellers)).
+        """
+        version, frames = self.current
+        return version, tuple(df.copy(deep=False) if df is not None else None for df in frames)
@@ -1,74 +1,199 @@
 import pandas as pd  # Importing pandas library for data manipulation
+import numpy as np  # Importing numpy for the PostID arrays
 import requests  # Importing requests library for making HTTP requests
-from bs4 import BeautifulSoup  # Importing BeautifulSoup for parsing HTML
-import time  # Importing time library for timing operations
 from requests.exceptions import RequestException  # Importing RequestException for handling request errors
 import logging  # Importing logging for logging errors and warnings
 import concurrent.futures  # Importing concurrent.futures for parallel execution
 from datetime import datetime, timedelta  # Importing datetime for working with dates and times
 import threading  # Importing threading for threading operations
 import math  # Importing math library for mathematical operations
+import queue  # Importing queue for the producer/consumer pipeline
+import multiprocessing  # Importing multiprocessing for the parser processes
 import os
+import re  # Importing re for reading PostIDs from links
+import argparse  # Importing argparse for the command line options
+from storage import ListingStore, DB_PATH  # Importing the SQLite listing store
+from records import RecordBuffer, records_to_frame  # Importing the listing record buffer
+from normalize import normalize  # Importing the ingest normalization stage
+import snapshot  # Importing the parquet snapshot writer
+import dashboard_data  # Importing the dashboard artifact builder
+from crawler import AsyncCrawler  # Importing the asyncio crawler engine
+from httpcache import HttpCache, CacheMiss, CACHE_DIR  # Importing the on-disk HTTP response cache
+from fetcher import Fetcher, RATE_LIMIT  # Importing the shared rate limiting and retry policy
+import parsers  # Importing the HTML parser backends
 
 
 logging.basicConfig(filename='error_log.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s: %(message)s')  # Configuring logging
 logging.warning('New Session Has Started')  # Logging a warning for a new session
 YEAR = 1950  # Setting a constant for the year
-MAX_RETRIES = 3  # Setting maximum retries for HTTP requests
-SLEEP_BETWEEN_REQUESTS = 5  # Setting sleep time between HTTP requests
 NUM_PROCESSES = 8  # Setting number of processes for parallel execution
 BATCH_SIZE = 100  # Setting batch size for processing data
+BASE_URL = 'https://somon.tj'  # Setting the site address (a local stub can be used for benchmarks)
+CRAWLER = 'threads'  # Setting the crawler engine: 'threads' or 'async'
+PIPELINE = True  # Fetching detail pages while listing pages are still being collected
+QUEUE_SIZE = 1000  # Setting maximum number of links waiting for the detail workers
+FLUSH_SIZE = 200  # Setting number of parsed cars kept in memory before writing them to the store
+CRAWL_MODE = 'full'  # Setting the crawl mode: 'full', 'delta' or 'auto' (delta unless a full sweep is due)
+DELTA_STOP_PAGES = 3  # Setting number of pages in a row with only known cars that ends a delta crawl
+FULL_SWEEP_HOURS = 24  # Setting hours after which 'auto' runs a full sweep again (sold detection needs it)
+HTTP_CACHE = CACHE_DIR  # Setting the HTTP cache directory, None disables the cache
+RECRAWL_HOURS = 24  # Setting hours after which a listing on the site is fetched again for price/views changes
+PRICETAGS_PATH = 'Pricetags.parquet'  # Setting the Mark Model x Date average price matrix file
+PARSE_WORKERS = 0  # Setting number of parser processes, 0 parses in the fetching threads (os.cpu_count() on the scraper box)
+
+
+POST_ID_PATTERN = re.compile(r'adv/(\d+)_')  # PostID part of a listing link
+
+
+def post_id(link):
+    # Extracting PostID from a listing link (https://somon.tj/adv/11432545_vaz-2107/)
+    return int(link.split('adv/')[1].split('_')[0])
+
+
+def post_ids(links):
+    # Extracting PostIDs of many links at once, one regex scan over the joined links
+    ids = POST_ID_PATTERN.findall('\n'.join(links))
+    if len(ids) != len(links):
+        raise ValueError(f'Unable to read PostIDs, {len(links) - len(ids)} links without one')
+    return np.array(ids, dtype=np.int64)
+
+
+def diff_ids(current, previous):
+    """
+    Compares the PostIDs of a crawl with the PostIDs in the store.
+
+    Parameters
+    ----------
+    current: array-like
+        PostIDs found on the listing pages (any order, duplicates allowed).
+    previous: array-like
+        PostIDs in the store.
+
+    Returns
+    -------
+    tuple
+        (new, gone, kept) sorted int64 arrays - only on the site, only in the store, in both.
+    """
+    current = np.unique(np.asarray(current, dtype=np.int64))
+    previous = np.unique(np.asarray(previous, dtype=np.int64))
+    # Locating every crawled PostID in the sorted store array with one binary search pass
+    position = np.searchsorted(previous, current)
+    found = position < len(previous)
+    found[found] = previous[position[found]] == current[found]
+    gone = np.ones(len(previous), dtype=bool)
+    gone[position[found]] = False
+    return current[~found], previous[gone], current[found]
+
 
 class CarMain:
-    def __init__(self) -> None:
+    def __init__(self, db_path=DB_PATH, base_url=BASE_URL, crawler=CRAWLER, pipeline=PIPELINE,
+                 parser=parsers.PARSER, parse_workers=PARSE_WORKERS, mode=CRAWL_MODE,
+                 cache=HTTP_CACHE, offline=False, rate=RATE_LIMIT) -> None:
         # Initializing class attributes
         self.year = YEAR  # Setting the year attribute to a constant value
         self.category = 'legkovyie-avtomobili'  # Setting the category of cars
         self.session = requests.Session()  # Creating a requests Session object for making HTTP requests
         self.lock = threading.Lock()  # Creating a threading lock for thread safety
+        self.base_url = base_url  # Setting the site address
+        self.crawler = crawler  # Setting the crawler engine
+        self.pipeline = pipeline  # Setting whether listing and detail pages are fetched together
+        self.parser = parsers.get_backend(parser)  # Setting the HTML parser backend
+        self.parse_workers = parse_workers  # Setting number of parser processes
+        self.parse_pool = None  # Process pool, only running during update()
+        self.mode = mode  # Setting the crawl mode
+        # Opening the HTTP cache, offline mode replays the cached pages without network
+        self.cache = HttpCache(cache, offline=offline) if cache else None
+        self.stored_ids = set()  # PostIDs in the store when the update started
+        # Sharing one rate limiter, concurrency limit and retry policy between all requests
+        self.fetcher = Fetcher(rate=rate)
+        self.failed_pages = []  # Listing pages that could not be fetched in the last crawl
+        self.run = {}  # Counters of the running update, saved to the runs table
         # Constructing the URL for fetching car data based on category and year
-        self.URL = f"https://somon.tj/transport/{self.category}/year_min---{self.year}/?page="
-        # Initializing dictionaries to store car information for both available and sold cars
-        self.car_info = {
-            'Name': [], 'PostID': [], 'AuthorName': [], 'AuthorID': [],
-            'WhatsApp': [], 'DatePublished':[], 'Description': [],
-            'Price': [], 'City': [], 'Кузов': [], 'Год выпуска': [],
-            'Цвет': [], 'Привод': [], 'Объем двигателя': [], 'Состояние': [],
-            'Вид топлива': [], 'Растаможен в РТ': [], 'Коробка передач': [],
-            'Views': []
-        }
-        self.car_info_sold = {
-            'Name': [], 'PostID': [], 'AuthorName': [], 'AuthorID': [],
-            'WhatsApp': [], 'DatePublished':[], 'Description': [],
-            'Price': [], 'City': [], 'Кузов': [], 'Год выпуска': [],
-            'Цвет': [], 'Привод': [], 'Объем двигателя': [], 'Состояние': [],
-            'Вид топлива': [], 'Растаможен в РТ': [], 'Коробка передач': [],
-            'Views': []
-        }
+        self.URL = f"{self.base_url}/transport/{self.category}/year_min---{self.year}/?page="
+        # Initializing buffers to store car information for both available and sold cars
+        self.car_info = RecordBuffer()
+        self.car_info_sold = RecordBuffer()
+        # Opening the listing store, importing the old Excel working set on the first run
+        self.store = ListingStore(db_path)
+        if self.store.count('today') == 0 and os.path.exists('ttoday.xlsx'):
+            self.store.import_excel('ttoday.xlsx', 'sold.xlsx')
         # Defining headers for the car information
         self.headers = ['Кузов', 'Год выпуска', 'Цвет', 'Привод', 'Объем двигателя',
            'Состояние', 'Вид топлива', 'Растаможен в РТ', 'Коробка передач']
 
+    def send(self, url):
+        # Sending one GET request through the HTTP cache, returns (content, changed)
+        if self.cache is not None:
+            return self.cache.get(self.session, url)
+        response = self.session.get(url)
+        # Checking if the response was successful (status code 200)
+        response.raise_for_status()
+        return response.content, True
+
+    def request(self, url):
+        # Sending a GET request with rate limiting and retries, replaying offline skips both
+        if self.cache is not None and self.cache.offline:
+            return self.send(url)
+        return self.fetcher.call(self.send, url)
+
     def fetch_page(self, url):
         try:
-            # Sending a GET request to the specified URL using the session object
-            response = self.session.get(url)
-            # Checking if the response was successful (status code 200)
-            response.raise_for_status()
-            # Returning the content of the response
-            return response.content
+            # Sending a GET request to the specified URL and returning the content of the response
+            return self.request(url)[0]
         except Exception as e:
             # Logging an error if there was an exception during the request
             logging.error(f'Error fetching page: {url} - {str(e)}')
             # Returning None if there was an error
             return None
 
-    def get_links(self):
+    def parse_page_count(self, content):
+        # Extracting the total number of pages from the first listing page
+        return parsers.parse_page_count(content, self.parser)
+
+    def parse_links(self, content):
+        # Extracting links to the detail pages from a listing page
+        return parsers.parse_links(content, self.base_url, self.parser)
+
+    def make_crawler(self):
+        # Creating the asyncio crawler that uses this collector's parsers
+        return AsyncCrawler(self.URL, self.parse_page_count, self.parse_links, cache=self.cache,
+                            fetcher=self.fetcher)
+
+    def get_links_delta(self, page_num, on_links, stop_after):
+        # Walking the pages newest-first until stop_after pages in a row held only known cars
+        links = []
+        known_run = 0
+        page = 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=stop_after) as executor:
+            while page <= page_num and known_run < stop_after:
+                window = range(page, min(page + stop_after, page_num + 1))
+                contents = executor.map(self.fetch_page, [f'{self.URL}{i}' for i in window])
+                for number, content in zip(window, contents):
+                    if not content:
+                        self.failed_pages.append(number)
+                        known_run = 0  # A missing page can not prove that nothing changed
+                        continue
+                    page_links = self.parse_links(content)
+                    links.extend(page_links)
+                    # on_links returns the number of new cars on the page
+                    known_run = known_run + 1 if on_links(page_links) == 0 else 0
+                    if known_run >= stop_after:
+                        break
+                page += len(window)
+        logging.info(f'Delta crawl stopped at page {page - 1}/{page_num}')
+        return links
+
+    def get_links(self, on_links=None, stop_after=None):
+        self.failed_pages = []
+        if self.crawler == 'async':
+            # Collecting links with the asyncio crawler, no detail pages are fetched here
+            links, self.failed_pages = self.make_crawler().run()
+            return links
         try:
             # Fetching the content of the first page to determine the total number of pages
-            soup = BeautifulSoup(self.session.get(f'{self.URL}{1}').content, 'html.parser')
-            # Extracting the total number of pages from the last page number link
-            page_num = int(soup.find_all('a', class_='page-number')[-1].text)
+            page_num = self.parse_page_count(self.request(f'{self.URL}{1}')[0])
+            if stop_after:
+                return self.get_links_delta(page_num, on_links, stop_after)
             links = []
 
             # Using ThreadPoolExecutor for concurrent execution of fetch_page method
@@ -81,20 +206,21 @@ class CarMain:
                     try:
                         # Retrieving the result of the future (response content)
                         response_content = future.result()
-                        if response_content:
-                            # Parsing the response content with BeautifulSoup
-                            soup = BeautifulSoup(response_content, 'html.parser')
-                            # Finding all car listing divs on the page
-                            divs = soup.find_all(class_='js-item-listing')
-
-                            # Extracting links from each car listing div and appending to links list
-                            for div in divs:
-                                link = div.find('a')['href']
-                                links.append('https://somon.tj' + link)
+                        if not response_content:
+                            # Remembering the page, its cars must not be taken for sold ones
+                            self.failed_pages.append(future_to_url[future])
+                        else:
+                            # Extracting links from the page and appending to links list
+                            page_links = self.parse_links(response_content)
+                            links.extend(page_links)
+                            # Handing the links to the pipeline right away
+                            if on_links is not None:
+                                on_links(page_links)
                             # Logging completion of getting links from the page
                             logging.info(f'Completed getting links from page {future_to_url[future]}/{page_num}')
                     except Exception as e:
                         # Handling exceptions for individual futures
+                        self.failed_pages.append(future_to_url[future])
                         error_message = f'Error accessing page: {future_to_url[future]} - {str(e)}'
                         print(error_message)  # Printing error message (optional)
                         logging.error(error_message)  # Logging error message
@@ -105,99 +231,42 @@ class CarMain:
             logging.error(f'Error getting links: {str(e)}')
             return None  # Returning None if there was an error
 
-    def parse_soup(self, car_info_dict, soup, link):
-        # Extracting car data and headers from the BeautifulSoup object
-        car_data = [i.text for i in soup.find_all(class_='value-chars')]
-        car_data_headers = [i.text.replace(':', '') for i in soup.find_all(class_='key-chars')]
-        
-        # Checking if the extracted data represents a car
-        if len(car_data) < 9:
-            # Logging that the extracted data does not represent a car
-            logging.info(f'{link} - is not a car({car_data})')
-            return None
-
-        # Updating car information dictionary with the extracted data
-        for header, data in zip(car_data_headers, car_data):
-            if header in car_info_dict:
-                car_info_dict[header].append(data)
-
-        # Extracting additional information about the car
-        name = soup.find(class_='title-announcement').text.replace('\n', '').lstrip().rstrip()
-        # Handling multiple names separated by commas
-        if ',' in name:
-            name = name.split(',')[0]
-        # Extracting author name and ID
-        car_info_dict['AuthorName'].append(soup.find(class_='author-name js-online-user').text.strip())
-        car_info_dict['AuthorID'].append(soup.find(class_='other-announcement-author').get('href').split('/')[-2])
-        car_info_dict['Views'].append(soup.find(class_='counter-views').text.split(' ')[1])
-
-        # Handling timestamp of the car listing publication date
-        timestamp = soup.find(class_='date-meta').text.replace('Опубликовано: ', '')
-        if 'Сегодня' in timestamp:
-            current_date = datetime.now().strftime('%d.%m.%Y')
-            timestamp = timestamp.replace('Сегодня', current_date)
-        elif 'Вчера' in timestamp:
-            yesterday_date = (datetime.now() - timedelta(days=1)).strftime('%d.%m.%Y')
-            timestamp = timestamp.replace('Вчера', yesterday_date)
-
-        # Adding parsed timestamp to car information dictionary
-        car_info_dict['DatePublished'].append(timestamp)
-
-        # Extracting WhatsApp contact information if available
-        whatsapp_elem = soup.find(class_='btn-author announcement-text-message__button _whatsapp js-messenger')
-        if whatsapp_elem is not None:
-            car_info_dict['WhatsApp'].append(whatsapp_elem.get('href').split('&')[0].split('phone=')[1])
+    def parse_content(self, link, content):
+        # Parsing the page with the selected backend, in a parser process when the pool is running
+        if self.parse_pool is not None:
+            return self.parse_pool.submit(parsers.parse_compact, content, link, self.parser).result()
+        return parsers.parse_compact(content, link, self.parser)
+
+    def parse_page(self, link, content):
+        result = self.parse_content(link, content)
+        # None means the page is not a car
+        if result is None:
+            return
+        sold, record = result
+        if sold:
+            # Logging that the car was sold, its information goes to the sold cars buffer
+            logging.info(f'Car was sold - {link}')
+            self.car_info_sold.append(record)
         else:
-            car_info_dict['WhatsApp'].append(None)
-
-        # Adding additional information to the car information dictionary
-        car_info_dict['Name'].append(name)
-        car_info_dict['PostID'].append(soup.find(class_='number-announcement').text.split(':')[-1].lstrip().rstrip())
-        car_info_dict['Description'].append(soup.find(class_='js-description').text.replace('\n', ' '))
-        car_info_dict['City'].append(soup.find(class_='announcement__location').text.rstrip().lstrip())
-        # Extracting and formatting car price
-        car_price = ''.join([i for i in soup.find(class_='announcement-price__cost').text.replace(" ", '').strip().replace('\n', ' ').split()[0] if i.isnumeric()])
-        car_info_dict['Price'].append(int(car_price))
+            self.car_info.append(record)
 
     def get_car_info(self, link):
-        retries = MAX_RETRIES  # Maximum number of retries for fetching the page
-        for _ in range(retries):
-            try:
-                # Sending a GET request to the provided link
-                response = self.session.get(link)
-                response.raise_for_status()  # Checking if the response was successful
-
-                soup = BeautifulSoup(response.content, 'html.parser')  # Parsing the HTML content using BeautifulSoup
-
-                # Checking if the car listing is marked as sold
-                sold = soup.find(class_='phone-author phone-author--sold phone-author--toggled')
-                if not sold:
-                    # If the car is not sold, parse its information and break the loop
-                    try:
-                        self.parse_soup(self.car_info, soup, link)
-                        break
-                    except RequestException as re:
-                        # Logging a warning if there's an error parsing the car info
-                        logging.warning(f'Unable to get car info: {re}')
-                else:
-                    # Logging that the car was sold and parsing its information for the sold cars dictionary
-                    logging.info(f'Car was sold - {link}')
-                    try:
-                        self.parse_soup(self.car_info_sold, soup, link)
-                        break
-                    except RequestException as re:
-                        # Logging a warning if there's an error parsing the car info for sold cars
-                        logging.warning(f'Unable to get car info: {re}')
-
-            except RequestException as re:
-                # Logging and retrying in case of connection error
-                logging.info(f'Retrying due to connection error: {re}')
-                print(f'Retrying due to connection error: {re}')
-                time.sleep(SLEEP_BETWEEN_REQUESTS)  # Sleeping between retries
-        else:
-            # Logging if failed after maximum retries
-            logging.info(f'Failed after {retries} retries: {link}')
-            print(f'Failed after {retries} retries: {link}')
+        try:
+            # Sending a GET request to the provided link (the fetch layer retries with backoff)
+            content, changed = self.request(link)
+        except CacheMiss as cm:
+            # Replaying offline, the page was never downloaded
+            logging.info(str(cm))
+            return
+        except RequestException as re:
+            # Logging if all the attempts failed
+            logging.info(f'Failed to get car info: {link} - {re}')
+            print(f'Failed to get car info: {link} - {re}')
+            return
+
+        # Parsing the page (unless it did not change)
+        if self.needs_parse(link, changed):
+            self.parse_page(link, content)
 
     def process_links(self, link_chunk):
         # Iterating through each link in the link chunk
@@ -211,10 +280,10 @@ class CarMain:
                 print(error_message)  # Printing the error message (optional)
                 logging.error(error_message)  # Logging the error message
 
-    def check_links(self):
+    def check_links(self, links=None, previous=None):
         try:
-            # Getting new links
-            new = self.get_links()
+            # Getting new links (unless they were already collected by the crawler)
+            new = self.get_links() if links is None else links
             logging.info(f'All new links are collected - {len(new)}')
 
             # Checking if new links were collected successfully
@@ -223,61 +292,258 @@ class CarMain:
                 raise ValueError
             else:
                 # Creating a DataFrame for new links
-                new_links = pd.DataFrame({"Link": new})
-
-            # Identifying sold and new cars fron freshly collected links
-            links_ids = [int(i.split('adv/')[1].split('_')[0]) for i in new_links['Link'].tolist()]
-            new_links['PostID'] = links_ids
-            df_today = pd.read_excel('ttoday.xlsx')
-            new_cars = new_links[~new_links['PostID'].isin(df_today['PostID'].tolist())]
-            sold_cars = df_today[~df_today['PostID'].isin(new_links['PostID'].tolist())]
-
-            # Saving new links to the Excel file
-            new_links.to_excel('links.xlsx', index=False)
+                new_links = self.links_frame(new)
+
+            # Identifying sold and new cars fron freshly collected links in one pass
+            new_ids, gone_ids, kept_ids = self.diff(new_links['PostID'].to_numpy(), previous)
+            new_cars = new_links.drop_duplicates('PostID').set_index('PostID')['Link'].reindex(new_ids)
+
+            if self.failed_pages:
+                # Cars of a missing listing page would be taken for sold ones, skipping the sold check
+                logging.warning(f'{len(self.failed_pages)} listing pages failed {sorted(self.failed_pages)}, '
+                                f'sold detection is skipped')
+                gone_ids = gone_ids[:0]
+                self.store.add_links(new_links)
+            else:
+                # Saving new links to the store
+                self.store.save_links(new_links)
 
             # Logging and returning the results
-            logging.info(f'check_links -> Done (new-{len(new_cars)}, sold-{len(sold_cars)})')
-            return [sold_cars['PostID'].tolist(), new_cars['Link'].tolist()]
+            self.run.update(links=len(new_links), new=len(new_ids), gone=len(gone_ids), kept=len(kept_ids),
+                            failed_pages=len(self.failed_pages))
+            logging.info(f'check_links -> Done (new-{len(new_cars)}, sold-{len(gone_ids)})')
+            return [gone_ids.tolist(), new_cars.tolist()]
         except Exception as e:
             # Logging errors if any occur during the process
             logging.error(f'Error checking links: {str(e)}')
             return None
 
+    def diff(self, ids, previous=None):
+        # Diffing crawled PostIDs against the cars that were on the site before the crawl
+        # (the store by default, the pipeline engines pass the PostIDs read before they wrote new cars)
+        return diff_ids(ids, self.store.today_ids() if previous is None else previous)
+
+    def links_frame(self, links):
+        # Creating a DataFrame of links and their PostIDs
+        return pd.DataFrame({'Link': links, 'PostID': post_ids(links)})
+
+    def save_batch(self, car_info, car_info_sold):
+        # Writing downloaded cars (lists of CarRecord) to the store, normalized once here
+        df_today_new = normalize(records_to_frame(car_info))
+        self.store.upsert_today(df_today_new)
+
+        logging.info('Number of actually sold cards: {}'.format(len(car_info_sold)))
+        df_sold_today = normalize(records_to_frame(car_info_sold))
+        self.store.append_sold(df_sold_today)
+
+        # Appending price/views events of the listings whose values changed
+        observed_at = datetime.now()
+        self.store.record_observations(df_today_new, observed_at)
+        self.store.record_observations(df_sold_today, observed_at)
+
+    def flush(self, force=False):
+        # Writing parsed cars to the store once FLUSH_SIZE of them are buffered (or always when forced)
+        with self.lock:
+            buffered = len(self.car_info) + len(self.car_info_sold)
+            if buffered == 0 or (not force and buffered < FLUSH_SIZE):
+                return
+            # Draining the buffers, the workers keep appending while the batch is written
+            car_info, car_info_sold = self.car_info.drain(), self.car_info_sold.drain()
+        self.save_batch(car_info, car_info_sold)
+
+    def claim_new(self, link, known):
+        # Returning True the first time a PostID that is not in the store is seen
+        link_id = post_id(link)
+        if link_id in known:
+            return False
+        known.add(link_id)
+        return True
+
+    def needs_parse(self, link, changed):
+        # An unchanged page of a car that is already stored would only produce the same row again
+        if changed or post_id(link) not in self.stored_ids:
+            return True
+        logging.info(f'Page did not change, skipping - {link}')
+        return False
+
+    def handle_detail(self, link, content, changed=True):
+        # Parsing a fetched detail page and flushing the buffers when they are full
+        if self.needs_parse(link, changed):
+            self.parse_page(link, content)
+            self.flush()
+
+    def move_sold(self, postids):
+        # Moving rows to the sold base
+        current_date = datetime.now().date()
+        moved = self.store.move_to_sold(postids, pd.to_datetime(current_date))
+
+        # Logging total number of sold cars
+        logging.info(f'Total # of sold cars - {self.store.count("sold")} (+{moved})')
+
+        # Logging completion of moving data to the sold base
+        logging.info('Data was moved to sold table')
+
+    def crawl_mode(self):
+        # Resolving 'auto' into 'full' when the last full sweep is older than FULL_SWEEP_HOURS
+        if self.mode != 'auto':
+            return self.mode
+        last_sweep = self.store.get_meta('last_full_sweep')
+        if last_sweep is None or datetime.now() - datetime.fromisoformat(last_sweep) >= timedelta(hours=FULL_SWEEP_HOURS):
+            return 'full'
+        return 'delta'
+
+    def known_ids(self, full):
+        # A full crawl refetches every car that is not on the site list, a delta crawl skips sold ones too
+        return set((self.store.today_ids() if full else self.store.known_ids()).tolist())
+
+    def finish_crawl(self, links, full, previous=None):
+        if links is None:
+            # check_links(None) would start another listing crawl, the failed one is only reported
+            logging.error('Not able to collect links, sold cars are not checked')
+            return
+        if full:
+            # Checking for sold cars once every listing page is collected
+            actions = self.check_links(links, previous)
+            if actions is None:
+                return
+            self.move_sold(actions[0])
+            if not self.failed_pages:
+                self.store.set_meta('last_full_sweep', datetime.now().isoformat())
+        else:
+            # A partial crawl can not tell which cars are gone, it only adds the new links
+            self.store.add_links(self.links_frame(links))
+            self.run.update(links=len(links), failed_pages=len(self.failed_pages))
+
+    def update_async(self, full=True):
+        try:
+            logging.info('Start updating (async)...')
+            # The cars on the site before the crawl, new and kept are counted against them
+            previous = self.store.today_ids()
+            known = self.known_ids(full)
+            known_count = len(known)
+
+            # Crawling listing pages and fetching unknown cars in one pipeline
+            links, self.failed_pages = self.make_crawler().run(
+                should_fetch=lambda link: self.claim_new(link, known),
+                on_detail=self.handle_detail,
+                stop_after=None if full else DELTA_STOP_PAGES)
+
+            # Saving the rest of the new data to the store
+            self.flush(force=True)
+
+            # Checking for sold cars on the collected links
+            self.finish_crawl(links, full, previous)
+            self.run['downloaded'] = len(known) - known_count
+            logging.warning(f'Done downloading {len(known) - known_count} new cars!')
+        except Exception as e:
+            # Logging undefined errors during update
+            logging.error(f'Undefined error during update: {str(e)}')
+
+    def update_pipeline(self, full=True):
+        try:
+            logging.info('Start updating (pipeline)...')
+            # The cars on the site before the crawl, new and kept are counted against them
+            previous = self.store.today_ids()
+            known = self.known_ids(full)
+            known_count = len(known)
+            links_queue = queue.Queue(maxsize=QUEUE_SIZE)  # Bounded, so the listing crawl waits for slow workers
+
+            def worker():
+                # Fetching detail pages from the queue until the stop marker arrives
+                while True:
+                    link = links_queue.get()
+                    if link is None:
+                        break
+                    self.process_links([link])
+                    self.flush()
+
+            def on_links(page_links):
+                # Queueing cars that are not in the store yet (each PostID only once)
+                queued = 0
+                for link in page_links:
+                    if self.claim_new(link, known):
+                        queued += 1
+                        links_queue.put(link)
+                return queued
+
+            workers = [threading.Thread(target=worker, daemon=True) for _ in range(NUM_PROCESSES)]
+            for thread in workers:
+                thread.start()
+            try:
+                links = self.get_links(on_links=on_links, stop_after=None if full else DELTA_STOP_PAGES)
+            finally:
+                # Stopping the workers once all queued links are processed
+                for _ in workers:
+                    links_queue.put(None)
+                for thread in workers:
+                    thread.join()
+
+            # Saving the rest of the new data to the store
+            self.flush(force=True)
+
+            # Checking for sold cars once every listing page is collected
+            self.finish_crawl(links, full, previous)
+            self.run['downloaded'] = len(known) - known_count
+            logging.warning(f'Done downloading {len(known) - known_count} new cars!')
+        except Exception as e:
+            # Logging undefined errors during update
+            logging.error(f'Undefined error during update: {str(e)}')
+
     def update(self):
+        # Starting the parser processes for the duration of the update
+        if self.parse_workers > 0:
+            # 'spawn' because the pool is started while fetching threads are running
+            self.parse_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.parse_workers, mp_context=multiprocessing.get_context('spawn'))
+        run_id = None
+        try:
+            self.stored_ids = set(self.store.known_ids().tolist())
+            # A delta crawl only walks the newest pages, a full one also detects sold cars
+            full = self.crawl_mode() == 'full'
+            logging.info(f'Crawl mode - {"full" if full else "delta"}')
+            # Recording the run, its counters tell the next run and the dashboard what changed
+            self.run = {}
+            run_id = self.store.start_run('full' if full else 'delta')
+            if self.crawler == 'async':
+                self.update_async(full)
+            elif self.pipeline:
+                self.update_pipeline(full)
+            else:
+                self.update_batches(full)
+        finally:
+            if run_id is not None:
+                self.store.finish_run(run_id, self.run)
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown()
+                self.parse_pool = None
+            if self.cache is not None:
+                logging.info(f'HTTP cache: {self.cache.hits} hits, {self.cache.misses} downloads')
+                self.cache.evict()
+
+    def update_batches(self, full=True):
         try:
             logging.info('Start updating...')
             
-            # Checking for new and sold cars
-            actions = self.check_links()
-            
-            # Loading data from Excel files
-            df_today = pd.read_excel('ttoday.xlsx')
-            df_sold = pd.read_excel('sold.xlsx')
-
-            # Moving rows to the sold base
-            postids = actions[0]
-            df_sold = df_today[df_today['PostID'].isin(postids)].copy()
-            df_today = df_today[~df_today['PostID'].isin(postids)].copy()
-            df_sold.reset_index(drop=True, inplace=True)
-            df_today.reset_index(drop=True, inplace=True)
-
-            current_date = datetime.now().date()
-
-            # Adding a new column 'sold_date' to df_sold with the current date
-            df_sold['sold_date'] = pd.to_datetime(current_date)
-            df_sold['Name'] = df_sold['Name'].apply(lambda x: x.split(',')[0] if ',' in x else x)
-            df_sold['Mark'] = df_sold['Name'].apply(lambda x: x.split(' ')[0])
-            df_sold['Model'] = df_sold['Name'].apply(lambda x: " ".join(x.split(' ')[1:]))
-            df_sold_old = pd.read_excel('sold.xlsx')
-            df_sold = pd.concat([df_sold_old, df_sold]).reset_index(drop=True)
-            
-            # Logging total number of sold cars
-            logging.info(f'Total # of sold cars - {len(df_sold)}')
-            df_sold['Объем двигателя'] = df_sold['Объем двигателя'].apply(self.transform_volume)
-            df_sold.to_excel('sold.xlsx', index=False)
+            if full:
+                # Checking for new and sold cars
+                actions = self.check_links()
+                self.move_sold(actions[0])
+                if not self.failed_pages:
+                    self.store.set_meta('last_full_sweep', datetime.now().isoformat())
+            else:
+                # Collecting only the new cars from the newest pages
+                known = self.known_ids(full)
+                new_links = []
 
-            # Logging completion of moving data to the sold base
-            logging.info('Data was moved to sold.xlsx')
+                def on_links(page_links):
+                    page_new = [link for link in page_links if self.claim_new(link, known)]
+                    new_links.extend(page_new)
+                    return len(page_new)
+
+                links = self.get_links(on_links=on_links, stop_after=DELTA_STOP_PAGES)
+                self.finish_crawl(links, full)
+                actions = [[], new_links]
+            self.run['downloaded'] = len(actions[1])
 
             # Downloading new data
             batch_size = 5000  # Define the batch size for downloading new data
@@ -286,9 +552,6 @@ class CarMain:
 
             # Looping through batches of links
             for i in range(total_iterations):
-                self.car_info = {key: [] for key in self.car_info.keys()}
-                self.car_info_sold = {key: [] for key in self.car_info_sold.keys()}
-
                 start_index = i * batch_size
                 end_index = min((i + 1) * batch_size, len(total_links))
 
@@ -301,19 +564,8 @@ class CarMain:
                 with concurrent.futures.ThreadPoolExecutor(max_workers=NUM_PROCESSES) as executor:
                     executor.map(self.process_links, link_chunks)
 
-                # Concatenating new data with existing data and saving to Excel
-                df_today_new = pd.DataFrame(self.car_info)
-                # df_old = pd.read_excel('ttoday.xlsx')
-                df_today = pd.concat([df_today_new, df_today]).reset_index(drop=True)
-                df_today['Объем двигателя'] = df_today['Объем двигателя'].apply(self.transform_volume)
-                df_today.to_excel('ttoday.xlsx', index=False)
-                
-                logging.info('Number of actually sold cards: {}'.format(len(self.car_info_sold)))
-                df_sold_today = pd.DataFrame(self.car_info_sold)
-                df_sold_today['Объем двигателя'] = df_sold_today['Объем двигателя'].apply(self.transform_volume)
-                df_sold_old = pd.read_excel('sold.xlsx')
-                df_sold_today = pd.concat([df_sold_old, df_sold_today]).reset_index(drop=True)
-                df_sold_today.to_excel('sold.xlsx', index=False)
+                # Saving new data to the store, only the new rows are written
+                self.flush(force=True)
 
                 # Logging completion of downloading data for the current batch
                 logging.warning(f'Done downloading {start_index}:{end_index} data!')
@@ -321,108 +573,173 @@ class CarMain:
             # Logging undefined errors during update
             logging.error(f'Undefined error during update: {str(e)}')
 
-    def transform_volume(self,x):
+    def recrawl(self, older_than_hours=RECRAWL_HOURS, limit=None):
+        """
+        Fetches listings that are still on the site again to record their price and views changes.
+
+        Parameters
+        ----------
+        older_than_hours: float
+            Only listings not checked for this many hours are fetched, the oldest first.
+        limit: int, optional
+            Maximum number of listings fetched in this run.
+
+        Returns
+        -------
+        int
+            Number of fetched listings.
+        """
+        links = self.store.stale_links(datetime.now() - timedelta(hours=older_than_hours), limit)
+        logging.info(f'Recrawling {len(links)} listings...')
+        self.stored_ids = set(self.store.known_ids().tolist())
+        unchanged = []
+        sold_ids = []
+
+        def recheck(link):
             try:
-                return float(x)
-            except Exception as e:
-                if x == 0.0:
-                    return 0.0
-                elif x != 'Электрический':
-                    return float(x.strip().split(' ')[0])
-                else:
-                    return 0.0  
-
-    def export(self):
-        try:
-            # Reading data from Excel files
-            df_today = pd.read_excel('ttoday.xlsx')
-            df_sold = pd.read_excel('sold.xlsx')
+                content, changed = self.request(link)
+            except RequestException as re:
+                logging.info(f'Failed to recrawl: {link} - {re}')
+                return
+            if not changed:
+                # Same page as last time (304 or the same body), nothing to parse
+                unchanged.append(post_id(link))
+                return
             try:
-                # Removing duplicates from both DataFrames
-                df_today = df_today.drop_duplicates()
-                df_sold = df_sold.drop_duplicates()
-                logging.info('Duplicates cleared.')
+                result = self.parse_content(link, content)
+                if result is None:
+                    return
+                sold, record = result
+                # Updating the row in "today" first, a sold car is then moved with its last values
+                self.car_info.append(record)
+                if sold:
+                    sold_ids.append(post_id(link))
+                self.flush()
             except Exception as e:
-                # Logging error if there's an issue clearing duplicates
-                logging.error(f'Error clearing duplicates: {str(e)}')
-
-            # Splitting 'Name' column into 'Mark' and 'Model' for sold DataFrame
-            df_sold['Name'] = df_sold['Name'].apply(lambda x: x.split(',')[0] if ',' in x else x)
-            df_sold['Mark'] = df_sold['Name'].apply(lambda x: x.split(' ')[0])
-            df_sold['Model'] = df_sold['Name'].apply(lambda x: " ".join(x.split(' ')[1:]))
-
-            # Splitting 'Name' column into 'Mark' and 'Model' for today DataFrame
-            df_today['Name'] = df_today['Name'].apply(lambda x: x.split(',')[0] if ',' in x else x)
-            df_today['Mark'] = df_today['Name'].apply(lambda x: x.split(' ')[0])
-            df_today['Model'] = df_today['Name'].apply(lambda x: " ".join(x.split(' ')[1:]))
-
-            # Getting current date in YYYY-MM-DD format
-            current_date = datetime.now().strftime('%Y-%m-%d')
-
-            # Appending the date to the file names for export
-            ttoday_filename = f'export/ttoday_{current_date}.xlsx'
-            sold_filename = f'export/sold_{current_date}.xlsx'
-
-            # Exporting transformed DataFrames to Excel files
-            df_today.to_excel(ttoday_filename, index=False)
-            df_sold.to_excel(sold_filename, index=False)
+                # A page that can not be parsed (e.g. a changed layout) is skipped like in process_links,
+                # the other listings are still rechecked and the done ones reported
+                logging.error(f'Error recrawling page: {link}-{e}')
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=NUM_PROCESSES) as executor:
+            list(executor.map(recheck, links))
+        self.flush(force=True)
+        self.store.mark_checked(unchanged, datetime.now())
+        self.move_sold(sold_ids)
+        logging.warning(f'Recrawl done: {len(links)} listings, {len(unchanged)} unchanged, {len(sold_ids)} sold')
+        return len(links)
+
+    def export(self, excel=False):
+        try:
+            # Reading data from the store, PostID is unique so there are no duplicates to clear
+            # (Mark, Model and the typed columns were written at ingest)
+            df_today = self.store.read_today()
+            df_sold = self.store.read_sold()
+            df_links = self.store.read_links()
+
+            # Writing today's parquet partition and registering it in export/manifest.json
+            tables = {'today': df_today, 'sold': df_sold, 'links': df_links}
+            entry = snapshot.write_snapshot(tables)
+
+            # Prebuilding the joined and typed tables of the dashboard, it only maps them on start
+            # (the selling time cells and the sellers are kept up to date by the store, they are not
+            # part of the snapshot)
+            dashboard_data.build(dict(tables, sold_time=self.store.read_sold_time(), sellers=self.store.read_sellers()),
+                                 source=entry['date'])
+
+            # Excel is only produced on request, the store stays the source of truth
+            if excel:
+                # Getting current date in YYYY-MM-DD format
+                current_date = datetime.now().strftime('%Y-%m-%d')
+
+                # Appending the date to the file names for export
+                ttoday_filename = f'export/ttoday_{current_date}.xlsx'
+                sold_filename = f'export/sold_{current_date}.xlsx'
+
+                # Exporting transformed DataFrames to Excel files
+                df_today.to_excel(ttoday_filename, index=False)
+                df_sold.to_excel(sold_filename, index=False)
+                df_links.to_excel('links.xlsx', index=False)
 
             # Logging completion of name transformation and export
             logging.info('Name transformation completed.')
+            return df_today, df_sold
         except Exception as e:
             # Logging error if there's an issue exporting names
             logging.error(f'Error exporting names: {str(e)}')
 
-    def price_tags(self):
-        # Get a list of all Excel files in the export directory that contain "ttoday_" in their name
-        excel_files = [file for file in os.listdir('export') if file.startswith('ttoday_') and file.endswith('.xlsx')]
-
-        # Initialize an empty list to store dataframes
-        dfs = []
-        # Read each Excel file into a dataframe and append it to the list
-        for file in excel_files:
-            df = pd.read_excel(os.path.join('export', file))
-            dfs.append(df)
-
-        # Concatenate all dataframes into one dataframe
-        merged_df = pd.concat(dfs, ignore_index=True)
-
-        merged_df['DatePublished'] = pd.to_datetime(merged_df['DatePublished'], format='%d.%m.%Y %H:%M')
-
-        # Sort the DataFrame by the 'DatePublished' column in ascending order
-        merged_df.sort_values(by='DatePublished', inplace=True)
-
-        # Convert 'DatePublished' back to the desired string format
-        merged_df['Date'] = merged_df['DatePublished'].dt.strftime('%d.%m.%Y')
-        merged_df['Time'] = merged_df['DatePublished'].dt.strftime('%H:%M:%S')
-        dates = list(merged_df['Date'].unique())
+    def price_tags(self, path=PRICETAGS_PATH, rebuild=False, excel=False):
+        """
+        Updates the matrix of average prices per Mark Model (rows) and publication day (columns).
+
+        Parameters
+        ----------
+        path: str
+            Parquet file of the matrix, the columns of the previous runs are kept.
+        rebuild: bool
+            Aggregates the whole history again instead of the days since the last column.
+        excel: bool
+            Also writes Pricetags.xlsx in the old layout.
+
+        Returns
+        -------
+        pd.DataFrame
+            The matrix, a mark_model column followed by one 'dd.mm.YYYY' column per day.
+        """
+        # Only the last stored day (it may have been partial) and the days after it are aggregated
+        prices = None
+        since = None
+        if not rebuild and os.path.exists(path):
+            prices = pd.read_parquet(path).set_index('mark_model')
+            if len(prices.columns) > 0:
+                since = pd.to_datetime(prices.columns, format='%d.%m.%Y').max()
+
+        # Every listing ever seen is either in "today" or in "sold", each PostID exactly once
+        merged_df = self.store.read_prices(since)
+        merged_df['Date'] = merged_df['DatePublished'].dt.normalize()
         merged_df['Mark Model'] = (merged_df['Mark'] + " " + merged_df['Model']).str.replace("  ", " ")
-        mark_model = merged_df['Mark Model'].unique()
-
-        grouped_df = merged_df.groupby(['Mark Model', 'Date'])['Price'].mean().reset_index()
-        grouped_df.set_index('Mark Model', inplace=True)
-
-        # Create an empty DataFrame to store the prices
-        prices = pd.DataFrame(index=mark_model, columns=dates)
-
-        # Iterate over each row in grouped_df
-        for index, row in grouped_df.iterrows():
-            car_brand = index  # 'Mark Model' is the index of grouped_df
-            date = row['Date']
-            price = row['Price']
-            if date in prices.columns:
-                prices.loc[car_brand, date] = price
-
-        # Convert the 'Price' column to numeric (optional)
-        prices = prices.apply(pd.to_numeric)
-
-        prices.to_excel('Pricetags.xlsx')
-
-
-
-collector = CarMain()
-collector.update()
-collector.export()
-collector.price_tags()
-
-# print(collector.check_links())
+        merged_df = merged_df.dropna(subset=['Date', 'Mark Model', 'Price'])
+        if merged_df.empty:
+            # Empty store or no prices since the last column, the pivot would have no date columns
+            logging.info('Price tags: no new prices')
+            if prices is None:
+                return pd.DataFrame(columns=['mark_model'])
+            return prices.rename_axis('mark_model').reset_index()
+        new_prices = merged_df.pivot_table(index='Mark Model', columns='Date', values='Price', aggfunc='mean')
+        new_prices.columns = new_prices.columns.strftime('%d.%m.%Y')
+
+        if prices is not None:
+            # Replacing the recomputed days, new Mark Models are added as rows
+            prices = pd.concat([prices.drop(columns=new_prices.columns, errors='ignore'), new_prices], axis=1)
+        else:
+            prices = new_prices
+        dates = pd.to_datetime(prices.columns, format='%d.%m.%Y')
+        prices = prices.iloc[:, dates.argsort()].astype(float)
+        prices = prices.rename_axis('mark_model').reset_index()
+
+        prices.to_parquet(path, index=False)
+        if excel:
+            prices.set_index('mark_model').rename_axis(None).to_excel('Pricetags.xlsx')
+        logging.info(f'Price tags: {len(prices)} models, {len(new_prices.columns)} days updated')
+        return prices
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Collect car listings from somon.tj')
+    parser.add_argument('--mode', choices=['full', 'delta', 'auto'], default=CRAWL_MODE,
+                        help="'delta' walks only the newest pages (hourly runs), 'auto' falls back to a full sweep when one is due")
+    parser.add_argument('--offline', action='store_true', help='replay the pages saved in the HTTP cache')
+    parser.add_argument('--no-cache', action='store_true', help='do not use the HTTP cache')
+    parser.add_argument('--excel', action='store_true', help='also export the xlsx workbooks')
+    parser.add_argument('--recrawl', type=int, metavar='N', default=0,
+                        help=f'also fetch up to N listings not checked for {RECRAWL_HOURS} hours to track price/views changes')
+    args = parser.parse_args()
+
+    collector = CarMain(mode=args.mode, cache=None if args.no_cache else HTTP_CACHE, offline=args.offline)
+    collector.update()
+    if args.recrawl:
+        collector.recrawl(limit=args.recrawl)
+    collector.export(excel=args.excel)
+    collector.price_tags(excel=args.excel)
+
+    # print(collector.check_links())
@@ -0,0 +1,222 @@
+import asyncio  # Importing asyncio for non-blocking waits in the async engine
+import logging  # Importing logging for logging retries
+import random  # Importing random for the backoff jitter
+import threading  # Importing threading for the shared limiter state
+import time  # Importing time library for timing operations
+
+import aiohttp  # Importing aiohttp for asynchronous HTTP errors
+import requests  # Importing requests library for HTTP errors
+
+
+RATE_LIMIT = 50  # Requests per second for all workers together, 0 disables the limit
+BURST = 20  # Requests that may be sent at once after an idle period
+MIN_CONCURRENCY = 2  # Lower bound of the adaptive concurrency limit
+START_CONCURRENCY = 16  # Concurrency limit the crawl starts with
+MAX_CONCURRENCY = 64  # Upper bound of the adaptive concurrency limit
+LATENCY_TARGET = 3.0  # Responses slower than this (seconds) count as congestion
+MAX_RETRIES = 5  # Maximum attempts for one request
+BACKOFF_BASE = 0.5  # First retry waits up to this many seconds, doubling every attempt
+BACKOFF_CAP = 30  # Longest wait between two attempts
+POLL_INTERVAL = 0.01  # How often a waiting coroutine checks the concurrency limit
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # Exponential backoff with full jitter, spreads retries of many workers over time
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def response_status(error):
+    # Extracting the HTTP status and Retry-After header of a failed request, (None, None) for network errors
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return response.status_code, response.headers.get('Retry-After')
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status, (error.headers or {}).get('Retry-After')
+    return None, None
+
+
+def is_throttled(status):
+    # 429 and server errors mean the site is overloaded or limiting us
+    return status is not None and (status == 429 or status >= 500)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all workers.
+
+    Tokens are reserved ahead, so reserve() returns how long the caller has to wait
+    for its token. That works the same for threads (time.sleep) and coroutines
+    (asyncio.sleep).
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # Taking one token, returns the delay in seconds until it is available
+        if not self.rate:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0, -self.tokens / self.rate)
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit (additive increase, multiplicative decrease).
+
+    Every successful, fast response raises the limit by about one per "window" of
+    requests, a 429, a server error or a slow response halves it (at most once per
+    LATENCY_TARGET, so one burst of errors does not collapse it to the minimum).
+    """
+
+    def __init__(self, start=START_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY,
+                 latency_target=LATENCY_TARGET):
+        self.limit = float(start)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.decreased = 0.0
+        self.condition = threading.Condition()
+
+    def try_acquire(self):
+        with self.condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        # Blocking the calling thread until a slot is free
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        # Waiting for a slot without blocking the event loop
+        while not self.try_acquire():
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def release(self, throttled, latency):
+        # Freeing a slot and adjusting the limit to the outcome of the request
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled or latency > self.latency_target:
+                if now - self.decreased > self.latency_target:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.decreased = now
+                    logging.info(f'Fetcher: concurrency limit lowered to {int(self.limit)}')
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class Fetcher:
+    """
+    Shared fetch policy of the listing and detail requests.
+
+    ...
+
+    Every request waits for a token of the rate limiter and a slot of the adaptive
+    concurrency limit. Network errors, 429 and 5xx answers are retried with exponential
+    backoff and full jitter (Retry-After is respected), other 4xx answers are final.
+
+    Methods
+    -------
+    call(send, url):
+        Runs send(url) in the calling thread under the policy.
+    acall(send, url):
+        Awaits send(url) in the event loop under the policy.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=BURST, max_retries=MAX_RETRIES, limiter=None):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = limiter or AIMDLimiter()
+        self.max_retries = max_retries
+
+    def retry_delay(self, attempt, error, url):
+        # Returning the wait before the next attempt, None when the error is final
+        status, retry_after = response_status(error)
+        if status is not None and not is_throttled(status):
+            return None
+        if attempt == self.max_retries - 1:
+            return None
+        delay = backoff_delay(attempt)
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, min(BACKOFF_CAP, int(retry_after)))
+        logging.info(f'Retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries}): {url} - {error}')
+        return delay
+
+    def call(self, send, url):
+        """
+        Sends a request from a worker thread.
+
+        Parameters
+        ----------
+        send: callable
+            Function sending the request, send(url) returns the result or raises
+            requests.RequestException.
+        url: str
+            Page address.
+
+        Returns
+        -------
+        object
+            Whatever send returned.
+
+        Raises
+        ------
+        requests.RequestException
+            The last error when all attempts failed or the error is final.
+        """
+        for attempt in range(self.max_retries):
+            time.sleep(self.bucket.reserve())
+            self.limiter.acquire()
+            start = time.perf_counter()
+            throttled = False
+            try:
+                result = send(url)
+            except requests.RequestException as e:
+                throttled = is_throttled(response_status(e)[0])
+                error = e
+            else:
+                return result
+            finally:
+                # The slot is freed whatever send raised, a leaked slot would never come back
+                self.limiter.release(throttled, time.perf_counter() - start)
+            delay = self.retry_delay(attempt, error, url)
+            if delay is None:
+                raise error
+            time.sleep(delay)
+
+    async def acall(self, send, url):
+        # Same as call() for a coroutine function, raises aiohttp.ClientError/asyncio.TimeoutError
+        for attempt in range(self.max_retries):
+            await asyncio.sleep(self.bucket.reserve())
+            await self.limiter.acquire_async()
+            start = time.perf_counter()
+            throttled = False
+            try:
+                result = await send(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                throttled = is_throttled(response_status(e)[0])
+                error = e
+            else:
+                return result
+            finally:
+                # The slot is freed whatever send raised, cancellation included
+                self.limiter.release(throttled, time.perf_counter() - start)
+            delay = self.retry_delay(attempt, error, url)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
@@ -0,0 +1,250 @@
+import hashlib  # Importing hashlib for content addressing of the bodies
+import logging  # Importing logging for logging cache events
+import os
+import sqlite3  # Importing sqlite3 for the cache index
+import threading  # Importing threading for serializing access from worker threads
+import time  # Importing time library for timestamps
+import zlib  # Importing zlib for compressing the stored bodies
+
+import aiohttp  # Importing aiohttp for the errors of the asynchronous requests
+import requests  # Importing requests library for making HTTP requests
+
+
+CACHE_DIR = 'http_cache'  # Default location of the response cache
+CACHE_TTL_HOURS = 24 * 7  # Entries not used for this long are evicted
+CACHE_MAX_MB = 1024  # Bodies are evicted (least recently used first) above this size
+
+
+class CacheMiss(requests.RequestException):
+    # Raised in offline mode for a page that was never cached, retrying does not help
+    pass
+
+
+class HttpCache:
+    """
+    On-disk HTTP response cache with conditional revalidation.
+
+    ...
+
+    The index (URL -> ETag, Last-Modified, body hash) lives in SQLite, bodies are stored
+    zlib-compressed under their sha256, so pages with the same content are stored once.
+    Every request is revalidated with If-None-Match/If-Modified-Since, a 304 answer is
+    served from disk. In offline mode the network is not used at all, which replays a
+    previous crawl (used for benchmarking).
+
+    Attributes
+    ----------
+    path : str
+        Cache directory.
+    ttl : float
+        Seconds after which an unused entry is evicted.
+    max_bytes : int
+        Maximum size of the stored (compressed) bodies.
+    offline : bool
+        Serve only from the cache, never touch the network.
+
+    Methods
+    -------
+    get(session, url):
+        Fetches a page with a requests session, returns (content, changed).
+    aget(session, url):
+        Same for an aiohttp session.
+    evict():
+        Drops expired entries and the least recently used ones above max_bytes.
+    """
+
+    def __init__(self, path=CACHE_DIR, ttl_hours=CACHE_TTL_HOURS, max_mb=CACHE_MAX_MB, offline=False):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = max_mb * 1024 * 1024
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(path, 'bodies'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(path, 'index.db'), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, etag TEXT, '
+                              'last_modified TEXT, body_hash TEXT, fetched_at REAL, used_at REAL)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS bodies (body_hash TEXT PRIMARY KEY, size INTEGER)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at)')
+        self.hits = 0  # Answers served from disk (304 or offline)
+        self.misses = 0  # Full downloads
+
+    def body_path(self, body_hash):
+        # Two-level layout keeps directories small
+        return os.path.join(self.path, 'bodies', body_hash[:2], body_hash + '.z')
+
+    def entry(self, url):
+        # Returning (etag, last_modified, body_hash) of a cached URL or None
+        with self.lock:
+            return self.conn.execute('SELECT etag, last_modified, body_hash FROM responses WHERE url = ?',
+                                     (url,)).fetchone()
+
+    def load(self, body_hash):
+        # Reading a stored body, None if the file is gone
+        try:
+            with open(self.body_path(body_hash), 'rb') as file:
+                return zlib.decompress(file.read())
+        except (OSError, zlib.error):
+            return None
+
+    def request_headers(self, entry):
+        # Building the conditional request headers from a cached entry
+        headers = {}
+        if entry is not None and self.load(entry[2]) is not None:
+            etag, last_modified, _ = entry
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def touch(self, url):
+        # Marking an entry as used, the TTL and LRU eviction are based on it
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE responses SET used_at = ? WHERE url = ?', (time.time(), url))
+
+    def save(self, url, headers, content, entry):
+        # Storing a downloaded body, returns True if it differs from the cached one
+        body_hash = hashlib.sha256(content).hexdigest()
+        changed = entry is None or entry[2] != body_hash
+        path = self.body_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = zlib.compress(content)
+            # Writing to a temporary file first, readers never see a half written body
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as file:
+                file.write(data)
+            os.replace(tmp, path)
+            with self.lock, self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO bodies VALUES (?, ?)', (body_hash, len(data)))
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                              (url, headers.get('ETag'), headers.get('Last-Modified'), body_hash, now, now))
+        return changed
+
+    def revalidated(self, url, entry):
+        # Answering a 304 from disk, None when the cached body is missing or corrupt
+        cached = self.load(entry[2]) if entry is not None else None
+        if cached is None:
+            return None
+        self.hits += 1
+        self.touch(url)
+        return cached, False
+
+    def downloaded(self, url, headers, content, entry):
+        # Storing a full response, returns (content, changed)
+        self.misses += 1
+        return content, self.save(url, headers, content, entry)
+
+    def replay(self, url):
+        # Serving a page in offline mode, None when it was never cached
+        entry = self.entry(url)
+        content = self.load(entry[2]) if entry is not None else None
+        if content is None:
+            logging.info(f'Not in the HTTP cache: {url}')
+            return None
+        self.hits += 1
+        return content, False
+
+    def get(self, session, url):
+        """
+        Fetches a page with a requests session through the cache.
+
+        Parameters
+        ----------
+        session: requests.Session
+            Session used for the request.
+        url: str
+            Page address.
+
+        Returns
+        -------
+        tuple
+            (content, changed) - changed is False when the body is the same as the cached one.
+
+        Raises
+        ------
+        requests.RequestException
+            When the request fails (CacheMiss if the page is not cached in offline mode).
+        """
+        if self.offline:
+            result = self.replay(url)
+            if result is None:
+                raise CacheMiss(f'Not in the HTTP cache: {url}')
+            return result
+        entry = self.entry(url)
+        response = session.get(url, headers=self.request_headers(entry))
+        if response.status_code == 304:
+            result = self.revalidated(url, entry)
+            if result is not None:
+                return result
+            # The cached body is gone, the empty 304 body must not replace it: asking for the full page
+            response = session.get(url)
+            if response.status_code == 304:
+                raise requests.HTTPError(f'304 without a cached body: {url}', response=response)
+        response.raise_for_status()
+        return self.downloaded(url, response.headers, response.content, entry)
+
+    async def aget(self, session, url):
+        # Fetching a page with an aiohttp session through the cache, returns (content, changed)
+        # or None for a page that is not cached in offline mode, request errors are raised
+        if self.offline:
+            return self.replay(url)
+        entry = self.entry(url)
+        async with session.get(url, headers=self.request_headers(entry)) as response:
+            if response.status == 304:
+                result = self.revalidated(url, entry)
+                if result is not None:
+                    return result
+            else:
+                response.raise_for_status()
+                return self.downloaded(url, response.headers, await response.read(), entry)
+        # The cached body is gone, the empty 304 body must not replace it: asking for the full page
+        async with session.get(url) as response:
+            response.raise_for_status()
+            if response.status == 304:
+                raise aiohttp.ClientResponseError(response.request_info, response.history, status=304,
+                                                  message=f'304 without a cached body: {url}')
+            return self.downloaded(url, response.headers, await response.read(), entry)
+
+    def evict(self):
+        # Dropping entries unused for the TTL, then the least recently used ones above max_bytes
+        with self.lock, self.conn:
+            expired = self.conn.execute('DELETE FROM responses WHERE used_at < ?', (time.time() - self.ttl,)).rowcount
+            # Only bodies still referenced count, the ones orphaned by the TTL are removed below anyway
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM bodies WHERE body_hash IN '
+                                      '(SELECT body_hash FROM responses)').fetchone()[0]
+            if total > self.max_bytes:
+                # Walking the entries from the oldest use until enough bytes are released,
+                # a body shared by several URLs is released with the last entry pointing to it
+                references = dict(self.conn.execute('SELECT body_hash, COUNT(*) FROM responses '
+                                                    'GROUP BY body_hash').fetchall())
+                sizes = self.conn.execute('SELECT r.url, r.body_hash, b.size FROM responses r JOIN bodies b '
+                                          'ON r.body_hash = b.body_hash ORDER BY r.used_at').fetchall()
+                dropped = []
+                for url, body_hash, size in sizes:
+                    if total <= self.max_bytes:
+                        break
+                    dropped.append((url,))
+                    references[body_hash] -= 1
+                    if references[body_hash] == 0:
+                        total -= size
+                self.conn.executemany('DELETE FROM responses WHERE url = ?', dropped)
+                expired += len(dropped)
+            # Removing bodies that no entry points to anymore
+            orphans = self.conn.execute('SELECT body_hash FROM bodies WHERE body_hash NOT IN '
+                                        '(SELECT body_hash FROM responses)').fetchall()
+            self.conn.executemany('DELETE FROM bodies WHERE body_hash = ?', orphans)
+        for (body_hash,) in orphans:
+            try:
+                os.remove(self.body_path(body_hash))
+            except OSError:
+                pass
+        logging.info(f'HTTP cache: {expired} entries and {len(orphans)} bodies evicted')
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,86 @@
+import re  # Importing re for the Mark/Model pattern
+
+import pandas as pd  # Importing pandas library for data manipulation
+
+from records import NUMERIC_FIELDS
+
+
+# Brands whose name has more than one word, everything else is split at the first space
+MULTI_WORD_MARKS = ['Land Rover', 'Ssang Yong', 'Iran Khodro', 'Great Wall', 'Alfa Romeo',
+                    'Aston Martin', 'Lynk & Co', 'Легковые автомобили']
+
+# One pattern splits Name into Mark and Model, longer brands are tried first
+MARK_PATTERN = re.compile(
+    r'^\s*(?P<Mark>{}|\S+)\s*(?P<Model>.*?)\s*$'.format(
+        '|'.join(re.escape(mark) for mark in sorted(MULTI_WORD_MARKS, key=len, reverse=True))))
+
+DATE_FORMAT = '%d.%m.%Y %H:%M'  # Format of DatePublished on the site
+ELECTRIC = 'Электрический'  # Engine volume of electric cars, stored as 0.0
+
+
+def split_name(names):
+    """
+    Splits car names into Mark and Model with vectorized string operations.
+
+    Parameters
+    ----------
+    names: pd.Series
+        Listing titles, e.g. "Land Rover Range Rover, 2015" or "ВАЗ 2107".
+
+    Returns
+    -------
+    pd.DataFrame
+        Name (without the part after a comma), Mark and Model columns.
+    """
+    name = names.astype('string').str.split(',', n=1).str[0].str.strip()
+    parts = name.str.extract(MARK_PATTERN)
+    return pd.DataFrame({'Name': name, 'Mark': parts['Mark'], 'Model': parts['Model'].fillna('')},
+                        index=names.index).astype(object)
+
+
+def parse_volume(volumes):
+    # Converting "1.7", "2.0 л" and "Электрический" into float liters (electric cars are 0.0)
+    if pd.api.types.is_numeric_dtype(volumes):
+        return volumes.astype(float)
+    text = volumes.astype('string')
+    number = text.str.extract(r'(\d+(?:[.,]\d+)?)', expand=False).str.replace(',', '.', regex=False)
+    volume = pd.to_numeric(number, errors='coerce').astype(float)
+    return volume.mask(text.str.contains(ELECTRIC, regex=False).fillna(False).to_numpy(dtype=bool), 0.0)
+
+
+def parse_dates(dates):
+    # Converting the site format (and already typed values) into datetimes
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    parsed = pd.to_datetime(dates, format=DATE_FORMAT, errors='coerce')
+    # Rows that were stored as ISO timestamps by an earlier run
+    missing = parsed.isna() & dates.notna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(dates[missing], format='ISO8601', errors='coerce')
+    return parsed
+
+
+def normalize(df):
+    """
+    Normalizes new listings once, before they are stored.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Listings with the FIELDS columns (from records_to_frame or an old workbook).
+
+    Returns
+    -------
+    pd.DataFrame
+        The same rows with Mark and Model columns, float engine volume, datetime
+        DatePublished and nullable integer PostID, AuthorID, Price, year and views.
+    """
+    df = df.copy()
+    if df.empty:
+        return df.assign(Mark=pd.Series(dtype=object), Model=pd.Series(dtype=object))
+    df[['Name', 'Mark', 'Model']] = split_name(df['Name'])
+    df['Объем двигателя'] = parse_volume(df['Объем двигателя'])
+    df['DatePublished'] = parse_dates(df['DatePublished'])
+    for column in NUMERIC_FIELDS:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+    return df
@@ -0,0 +1,255 @@
+import logging  # Importing logging for logging parser events
+from datetime import datetime, timedelta  # Importing datetime for working with dates and times
+
+from bs4 import BeautifulSoup  # Importing BeautifulSoup, the fallback backend
+
+try:
+    import lxml.html  # Importing lxml, the C-based backend with precompiled XPath
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser  # Optional C-based backend
+except ImportError:
+    SelectolaxParser = None
+
+from records import FIELDS, CarRecord
+
+
+PARSER = 'auto'  # Setting the parser backend: 'auto', 'lxml', 'selectolax' or 'bs4'
+
+# CSS classes of the elements read from the pages, several classes mean "all of them"
+CLASSES = {
+    'values': 'value-chars',
+    'keys': 'key-chars',
+    'title': 'title-announcement',
+    'author': 'author-name js-online-user',
+    'author_link': 'other-announcement-author',
+    'views': 'counter-views',
+    'date': 'date-meta',
+    'whatsapp': 'btn-author announcement-text-message__button _whatsapp js-messenger',
+    'post_id': 'number-announcement',
+    'description': 'js-description',
+    'city': 'announcement__location',
+    'price': 'announcement-price__cost',
+    'sold': 'phone-author phone-author--sold phone-author--toggled',
+    'listing': 'js-item-listing',
+    'page': 'page-number',
+}
+
+
+def extract(doc, link):
+    """
+    Builds the record of one detail page from a parsed document.
+
+    Parameters
+    ----------
+    doc: object
+        Backend document with texts(key), text(key), attr(key, name) and exists(key) methods.
+    link: str
+        Link of the page, used for logging.
+
+    Returns
+    -------
+    tuple or None
+        (sold, record) where record is a dict keyed by FIELDS, None if the page is not a car.
+    """
+    # Extracting car data and headers
+    car_data = doc.texts('values')
+    car_data_headers = [i.replace(':', '') for i in doc.texts('keys')]
+
+    # Checking if the extracted data represents a car
+    if len(car_data) < 9:
+        # Logging that the extracted data does not represent a car
+        logging.info(f'{link} - is not a car({car_data})')
+        return None
+
+    record = dict.fromkeys(FIELDS)
+    for header, data in zip(car_data_headers, car_data):
+        if header in record:
+            record[header] = data
+
+    # Extracting additional information about the car, handling multiple names separated by commas
+    record['Name'] = doc.text('title').replace('\n', '').strip().split(',')[0]
+    record['AuthorName'] = doc.text('author').strip()
+    record['AuthorID'] = doc.attr('author_link', 'href').split('/')[-2]
+    record['Views'] = doc.text('views').split(' ')[1]
+
+    # Handling timestamp of the car listing publication date
+    timestamp = doc.text('date').replace('Опубликовано: ', '')
+    if 'Сегодня' in timestamp:
+        timestamp = timestamp.replace('Сегодня', datetime.now().strftime('%d.%m.%Y'))
+    elif 'Вчера' in timestamp:
+        timestamp = timestamp.replace('Вчера', (datetime.now() - timedelta(days=1)).strftime('%d.%m.%Y'))
+    record['DatePublished'] = timestamp
+
+    # Extracting WhatsApp contact information if available
+    whatsapp = doc.attr('whatsapp', 'href')
+    record['WhatsApp'] = whatsapp.split('&')[0].split('phone=')[1] if whatsapp is not None else None
+
+    record['PostID'] = doc.text('post_id').split(':')[-1].strip()
+    record['Description'] = doc.text('description').replace('\n', ' ')
+    record['City'] = doc.text('city').strip()
+    # Extracting and formatting car price
+    price = doc.text('price').replace(' ', '').strip().replace('\n', ' ').split()[0]
+    record['Price'] = int(''.join(i for i in price if i.isnumeric()))
+    return doc.exists('sold'), record
+
+
+class Bs4Document:
+    # BeautifulSoup document, kept as the reference and fallback implementation
+    def __init__(self, content):
+        self.soup = BeautifulSoup(content, 'html.parser')
+
+    def find(self, key):
+        return self.soup.find(class_=CLASSES[key])
+
+    def texts(self, key):
+        return [i.text for i in self.soup.find_all(class_=CLASSES[key])]
+
+    def text(self, key):
+        return self.find(key).text
+
+    def attr(self, key, name):
+        element = self.find(key)
+        return element.get(name) if element is not None else None
+
+    def exists(self, key):
+        return self.find(key) is not None
+
+    def links(self):
+        return [div.find('a')['href'] for div in self.soup.find_all(class_=CLASSES['listing'])]
+
+
+if lxml is not None:
+    # Compiling the selector once at import time, it returns every element with a class attribute
+    HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+    CLASSED_XPATH = etree.XPath('//*[@class]')
+
+# Class sets of the wanted elements and, for every single class, the keys it can belong to
+CLASS_SETS = {key: frozenset(classes.split()) for key, classes in CLASSES.items()}
+CLASS_KEYS = {}
+for _key, _classes in CLASS_SETS.items():
+    for _class in _classes:
+        CLASS_KEYS.setdefault(_class, []).append(_key)
+
+
+class LxmlDocument:
+    # lxml document indexed by class in a single pass instead of one tree scan per field
+    def __init__(self, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        root = lxml.html.fromstring(content, parser=HTML_PARSER)
+        self.found = {}
+        for element in CLASSED_XPATH(root):
+            classes = element.get('class').split()
+            keys = {key for c in classes if c in CLASS_KEYS for key in CLASS_KEYS[c]}
+            for key in keys:
+                if CLASS_SETS[key].issubset(classes):
+                    self.found.setdefault(key, []).append(element)
+
+    def find(self, key):
+        found = self.found.get(key)
+        return found[0] if found else None
+
+    def texts(self, key):
+        return [i.text_content() for i in self.found.get(key, [])]
+
+    def text(self, key):
+        return self.find(key).text_content()
+
+    def attr(self, key, name):
+        element = self.find(key)
+        return element.get(name) if element is not None else None
+
+    def exists(self, key):
+        return self.find(key) is not None
+
+    def links(self):
+        links = []
+        for div in self.found.get('listing', []):
+            anchor = next(div.iter('a'))
+            links.append(anchor.get('href'))
+        return links
+
+
+# CSS selectors for selectolax, built once
+SELECTORS = {key: ''.join('.' + c for c in classes.split()) for key, classes in CLASSES.items()}
+
+
+class SelectolaxDocument:
+    # selectolax (lexbor) document queried with CSS selectors
+    def __init__(self, content):
+        self.tree = SelectolaxParser(content)
+
+    def find(self, key):
+        return self.tree.css_first(SELECTORS[key])
+
+    def texts(self, key):
+        return [i.text() for i in self.tree.css(SELECTORS[key])]
+
+    def text(self, key):
+        return self.find(key).text()
+
+    def attr(self, key, name):
+        element = self.find(key)
+        return element.attributes.get(name) if element is not None else None
+
+    def exists(self, key):
+        return self.find(key) is not None
+
+    def links(self):
+        links = []
+        for div in self.tree.css(SELECTORS['listing']):
+            anchor = div.css_first('a')
+            links.append(anchor.attributes.get('href'))
+        return links
+
+
+# Backends in order of preference for 'auto'
+BACKENDS = {
+    'selectolax': SelectolaxDocument if SelectolaxParser is not None else None,
+    'lxml': LxmlDocument if lxml is not None else None,
+    'bs4': Bs4Document,
+}
+
+
+def available_backends():
+    # Returning the names of the backends that can be used in this environment
+    return [name for name, document in BACKENDS.items() if document is not None]
+
+
+def get_backend(name=PARSER):
+    # Resolving a backend name, 'auto' picks the fastest installed one and falls back to BeautifulSoup
+    if name == 'auto':
+        return available_backends()[0]
+    if BACKENDS.get(name) is None:
+        logging.warning(f'Parser backend {name} is not available, using bs4')
+        return 'bs4'
+    return name
+
+
+def parse_detail(content, link, backend=PARSER):
+    # Parsing a detail page, returns (sold, record) or None if it is not a car
+    return extract(BACKENDS[get_backend(backend)](content), link)
+
+
+def parse_compact(content, link, backend=PARSER):
+    # Parsing a detail page into (sold, CarRecord), used by the parser processes
+    # because a tuple pickles much smaller than a dict and nothing shared is mutated
+    result = parse_detail(content, link, backend)
+    if result is None:
+        return None
+    sold, record = result
+    return sold, CarRecord(*(record[key] for key in FIELDS))
+
+
+def parse_links(content, base_url, backend=PARSER):
+    # Parsing a listing page into absolute detail links
+    return [base_url + href for href in BACKENDS[get_backend(backend)](content).links()]
+
+
+def parse_page_count(content, backend=PARSER):
+    # Extracting the total number of pages from the last page number link
+    return int(BACKENDS[get_backend(backend)](content).texts('page')[-1])
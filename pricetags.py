@@ -0,0 +1,88 @@
+import os
+
+import numpy as np  # Importing numpy for the price matrix
+import pandas as pd  # Importing pandas library for data manipulation
+
+
+PRICETAGS_PATH = 'Pricetags.parquet'  # Matrix written by dbworker.CarMain.price_tags
+PRICETAGS_XLSX = 'Pricetags.xlsx'  # Old layout of the matrix, read when there is no parquet file
+DATE_FORMAT = '%d.%m.%Y'  # Format of the date columns
+
+
+class PriceSeries:
+    """
+    Average prices per Mark Model and day, held as one float matrix.
+
+    ...
+
+    The rows are the Mark Models (looked up through a dict), the columns are the days
+    in ascending order, so a date range is two binary searches and a model's series is
+    a slice of its row.
+
+    Attributes
+    ----------
+    names : np.ndarray
+        Mark Model of every row.
+    dates : np.ndarray
+        Sorted datetime64 days of the columns.
+    prices : np.ndarray
+        Average price per row and day, NaN when nothing was published that day.
+
+    Methods
+    -------
+    date_range(start, end):
+        Returns the column slice of the days between start and end.
+    series(names, start=None, end=None):
+        Returns (name, dates, prices) of the given models in the range.
+    """
+
+    def __init__(self, df):
+        self.names = df['mark_model'].to_numpy(dtype=object)
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        columns = df.columns[1:]
+        dates = pd.to_datetime(columns, format=DATE_FORMAT).to_numpy()
+        order = np.argsort(dates, kind='stable')
+        self.dates = dates[order]
+        self.prices = df[columns].to_numpy(dtype=float)[:, order]
+
+    @classmethod
+    def load(cls, path=PRICETAGS_PATH):
+        # Reading the matrix written by dbworker, the old xlsx layout as a fallback
+        if os.path.exists(path):
+            return cls(pd.read_parquet(path))
+        df_price = pd.read_excel(PRICETAGS_XLSX)
+        return cls(df_price.rename(columns={"Unnamed: 0": "mark_model"}))
+
+    def date_range(self, start=None, end=None):
+        # Columns of the days from start to end (inclusive), found by binary search
+        first = 0 if start is None else np.searchsorted(self.dates, np.datetime64(start, 'ns'), side='left')
+        last = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(end, 'ns'), side='right')
+        return slice(first, last)
+
+    def series(self, names, start=None, end=None):
+        """
+        Returns the price series of the models in a date range.
+
+        Parameters
+        ----------
+        names : iterable
+            Mark Models, the ones without prices are skipped.
+        start, end : datetime-like, optional
+            First and last day, the whole matrix by default.
+
+        Returns
+        -------
+        list
+            (name, dates, prices) per model, days without a price are left out.
+        """
+        columns = self.date_range(start, end)
+        dates = self.dates[columns]
+        result = []
+        for name in names:
+            row = self.rows.get(name)
+            if row is None:
+                continue
+            prices = self.prices[row, columns]
+            present = ~np.isnan(prices)
+            result.append((name, dates[present], prices[present]))
+        return result
@@ -0,0 +1,87 @@
+import threading  # Importing threading for the buffer lock
+from collections import namedtuple  # Importing namedtuple for the compact listing record
+
+import pandas as pd  # Importing pandas library for data manipulation
+
+
+# Columns collected for every listing, in the order they are exported
+FIELDS = ['Name', 'PostID', 'AuthorName', 'AuthorID',
+          'WhatsApp', 'DatePublished', 'Description',
+          'Price', 'City', 'Кузов', 'Год выпуска',
+          'Цвет', 'Привод', 'Объем двигателя', 'Состояние',
+          'Вид топлива', 'Растаможен в РТ', 'Коробка передач',
+          'Views']
+
+# One tuple per listing, attribute names follow FIELDS (column names are not valid identifiers)
+CarRecord = namedtuple('CarRecord', [
+    'name', 'post_id', 'author_name', 'author_id',
+    'whatsapp', 'date_published', 'description',
+    'price', 'city', 'body', 'year',
+    'color', 'drive', 'volume', 'condition',
+    'fuel', 'customs', 'gearbox',
+    'views'])
+
+# Numeric columns, they are converted once when the records become a dataframe
+NUMERIC_FIELDS = ['PostID', 'AuthorID', 'Price', 'Год выпуска', 'Views']
+
+
+def records_to_frame(records):
+    """
+    Converts a list of CarRecord tuples into a typed dataframe in one pass.
+
+    Parameters
+    ----------
+    records: list
+        CarRecord tuples.
+
+    Returns
+    -------
+    pd.DataFrame
+        Dataframe with FIELDS columns, numeric columns as nullable integers.
+    """
+    df = pd.DataFrame.from_records(records, columns=FIELDS)
+    for column in NUMERIC_FIELDS:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+    return df
+
+
+class RecordBuffer:
+    """
+    Thread-safe buffer of parsed listings.
+
+    ...
+
+    Every listing is appended as one complete CarRecord under a lock, so a page that
+    fails while parsing never leaves a partial row behind.
+
+    Methods
+    -------
+    append(record):
+        Adds one record.
+    drain():
+        Returns all buffered records and empties the buffer.
+    to_frame():
+        Returns the buffered records as a typed dataframe without draining.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def append(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def drain(self):
+        # Swapping the list under the lock, writers keep appending to the new one
+        with self.lock:
+            records, self.records = self.records, []
+        return records
+
+    def to_frame(self):
+        with self.lock:
+            records = list(self.records)
+        return records_to_frame(records)
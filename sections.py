@@ -0,0 +1,108 @@
+import numpy as np
+import streamlit as st
+
+
+PAGE_SIZE = 50  # Rows sent to the browser per table page
+NO_SORT = '—'  # Sort option keeping the rows in their order
+KEPT_PREFIX = '_kept_'  # Session state copies of the widget values, they survive st.rerun()
+
+
+def recall(key, default):
+    # Value of a widget saved by remember(), default when there is none
+    return st.session_state.get(KEPT_PREFIX + key, default)
+
+
+def remember(key, value):
+    # Saving a widget value under a plain session state key. Streamlit drops the state of a
+    # widget that was not rendered before st.rerun() (the sidebar filters rerun on every change),
+    # the saved value then seeds the widget again
+    st.session_state[KEPT_PREFIX + key] = value
+    return value
+
+
+def lazy_tabs(labels, key, parent=None):
+    """
+    Section selector used instead of st.tabs, only the selected section is computed.
+
+    st.tabs renders every tab body on every rerun. Here the page checks which section
+    is selected and runs only its code, so a rerun costs what is on screen.
+
+    Parameters
+    ----------
+    labels : list
+        Section titles.
+    key : str
+        Widget key, keeps the selection across reruns.
+    parent : streamlit container, optional
+        Where the selector and the section are rendered, the main area by default.
+
+    Returns
+    -------
+    tuple
+        (index of the selected section, list with one container per label). All
+        entries are the same container, so code written for st.tabs (tabs[i].header(...))
+        keeps working inside `if selected == i:`.
+    """
+    parent = parent if parent is not None else st
+    kept = recall(key, labels[0])
+    index = labels.index(kept) if kept in labels else 0
+    selected = remember(key, parent.radio(key, labels, index=index, horizontal=True, key=key,
+                                          label_visibility='collapsed'))
+    container = parent.container()
+    return labels.index(selected), [container] * len(labels)
+
+
+def page_order(df, column, ascending):
+    # Row positions in the display order, missing values last like sort_values
+    if column == NO_SORT:
+        return np.arange(len(df))
+    values = df[column].reset_index(drop=True)
+    return values.sort_values(ascending=ascending, na_position='last', kind='stable').index.to_numpy()
+
+
+def paged_table(df, key, parent=None, columns=None, page_size=PAGE_SIZE, **kwargs):
+    """
+    Table that keeps the rows on the server and sends only the visible page.
+
+    st.dataframe serializes the whole frame on every rerun. Here the rows are
+    sorted on the server (by position, nothing is copied) and only page_size rows
+    plus the totals reach the browser, whatever the number of rows.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Rows of the table.
+    key : str
+        Prefix of the widget keys.
+    parent : streamlit container, optional
+        Where the table is rendered, the main area by default.
+    columns : list, optional
+        Displayed columns, all by default.
+    page_size : int
+        Rows per page.
+    **kwargs
+        Passed to st.dataframe.
+    """
+    parent = parent if parent is not None else st
+    columns = list(columns) if columns is not None else list(df.columns)
+    pages = max(1, -(-len(df) // page_size))
+
+    # Sort, order and page are kept outside the widget state, like the section in lazy_tabs
+    sort_options, orders = [NO_SORT] + columns, ['↑', '↓']
+    c1, c2, c3 = parent.columns([2, 1, 1])
+    kept = recall(f'{key}_sort', NO_SORT)
+    column = remember(f'{key}_sort', c1.selectbox('Сортировать по', sort_options, key=f'{key}_sort',
+                                                  index=sort_options.index(kept) if kept in sort_options else 0))
+    kept = recall(f'{key}_order', orders[0])
+    ascending = remember(f'{key}_order', c2.radio('Порядок', orders, index=orders.index(kept), horizontal=True,
+                                                  key=f'{key}_order')) == '↑'
+    page = remember(f'{key}_page', c3.number_input(f'Страница (из {pages})', min_value=1, max_value=pages,
+                                                   value=min(recall(f'{key}_page', 1), pages), step=1,
+                                                   key=f'{key}_page'))
+    page = min(page, pages)
+
+    positions = page_order(df, column, ascending)[(page - 1) * page_size:page * page_size]
+    # Slicing the rows first, only the page is copied
+    parent.dataframe(df.iloc[positions][columns], **kwargs)
+    first = (page - 1) * page_size + 1 if len(df) else 0
+    parent.caption(f'Строки {first}–{(page - 1) * page_size + len(positions)} из {len(df)}')
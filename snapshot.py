@@ -0,0 +1,124 @@
+import json  # Importing json for the manifest
+import logging  # Importing logging for logging snapshot events
+import os
+from datetime import datetime  # Importing datetime for the partition names
+
+import pandas as pd  # Importing pandas library for data manipulation
+
+
+SNAPSHOT_DIR = 'export'  # Directory of the daily snapshots
+MANIFEST = 'manifest.json'  # List of the snapshots, newest last
+COMPRESSION = 'zstd'  # Parquet compression codec
+
+# Low-cardinality text columns, stored dictionary-encoded (pandas categoricals)
+CATEGORICAL_COLUMNS = ['Name', 'Mark', 'Model', 'City', 'Кузов', 'Цвет', 'Привод', 'Состояние',
+                       'Вид топлива', 'Растаможен в РТ', 'Коробка передач']
+
+
+def manifest_path(directory=SNAPSHOT_DIR):
+    return os.path.join(directory, MANIFEST)
+
+
+def read_manifest(directory=SNAPSHOT_DIR):
+    # Returning the manifest, an empty one when no snapshot was written yet
+    try:
+        with open(manifest_path(directory), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'snapshots': []}
+
+
+def _write_manifest(manifest, directory):
+    # Replacing the manifest atomically, readers never see a half written file
+    tmp = manifest_path(directory) + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1)
+    os.replace(tmp, manifest_path(directory))
+
+
+def _encode(df):
+    # Turning the repeated text columns into categoricals, parquet stores them as dictionaries
+    columns = [c for c in CATEGORICAL_COLUMNS if c in df.columns]
+    return df.astype({c: 'category' for c in columns})
+
+
+def decode_columns(df):
+    # Returning plain numpy dtypes, the same the old workbooks were read with
+    # (categoricals become text, nullable integers become int64 or float64 when they have gaps)
+    dtypes = {}
+    for column in df.columns:
+        dtype = df[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtypes[column] = object
+        elif isinstance(dtype, pd.Int64Dtype):
+            dtypes[column] = 'float64' if df[column].isna().any() else 'int64'
+    return df.astype(dtypes)
+
+
+def write_snapshot(tables, date=None, directory=SNAPSHOT_DIR):
+    """
+    Writes one date partition of parquet files and registers it in the manifest.
+
+    Parameters
+    ----------
+    tables: dict
+        Name -> dataframe, e.g. {'today': df_today, 'sold': df_sold, 'links': df_links}.
+    date: datetime, optional
+        Date of the snapshot, today by default. Writing the same date again replaces it.
+    directory: str
+        Snapshot directory, the partitions are written to <directory>/date=YYYY-MM-DD/.
+
+    Returns
+    -------
+    dict
+        Manifest entry of the snapshot.
+    """
+    date = (date or datetime.now()).strftime('%Y-%m-%d')
+    partition = os.path.join(directory, f'date={date}')
+    os.makedirs(partition, exist_ok=True)
+    entry = {'date': date, 'files': {}, 'rows': {}}
+    for name, df in tables.items():
+        path = os.path.join(partition, f'{name}.parquet')
+        _encode(df).to_parquet(path + '.tmp', index=False, compression=COMPRESSION)
+        os.replace(path + '.tmp', path)
+        entry['files'][name] = os.path.relpath(path, directory).replace(os.sep, '/')
+        entry['rows'][name] = len(df)
+
+    manifest = read_manifest(directory)
+    manifest['snapshots'] = [s for s in manifest['snapshots'] if s['date'] != date] + [entry]
+    manifest['snapshots'].sort(key=lambda s: s['date'])
+    _write_manifest(manifest, directory)
+    logging.info(f'Snapshot {date} written: {entry["rows"]}')
+    return entry
+
+
+def load_snapshot(date=None, directory=SNAPSHOT_DIR, decode=True):
+    """
+    Loads the tables of a snapshot listed in the manifest.
+
+    Parameters
+    ----------
+    date: str, optional
+        'YYYY-MM-DD' of the snapshot, the newest one by default.
+    directory: str
+        Snapshot directory.
+    decode: bool
+        Converts the categorical columns back to plain text columns.
+
+    Returns
+    -------
+    dict or None
+        Name -> dataframe, None when there is no such snapshot.
+    """
+    snapshots = read_manifest(directory)['snapshots']
+    if date is not None:
+        snapshots = [s for s in snapshots if s['date'] == date]
+    if not snapshots:
+        return None
+    tables = {}
+    for name, path in snapshots[-1]['files'].items():
+        df = pd.read_parquet(os.path.join(directory, path))
+        if decode:
+            df = decode_columns(df)
+        tables[name] = df
+    return tables
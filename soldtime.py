@@ -0,0 +1,109 @@
+import numpy as np  # Importing numpy for the histograms
+import pandas as pd  # Importing pandas library for data manipulation
+
+
+DIMENSIONS = ['Mark', 'Model', 'City', 'Кузов']  # Grouping columns of the selling time table
+DAY = 'sold_day'  # Day of the sale, 'YYYY-MM-DD'
+# Edges of the selling time bins in days: quarter days up to a day, days up to two months,
+# weeks up to half a year, months up to a year, a sale of more than a year falls into the last bin
+BINS = np.concatenate([[0, 0.25, 0.5], np.arange(1, 61), np.arange(67, 183, 7), np.arange(212, 366, 30), [np.inf]])
+UNKNOWN_BIN = -1  # Bin of the sales without a publication date, counted but not timed
+
+
+def sold_time_cells(df, dimensions=DIMENSIONS, published='DatePublished', sold='sold_date'):
+    """
+    Groups sold listings into selling time cells.
+
+    A cell is a day, a combination of the dimensions and a selling time bin, with the
+    number of sales and the sum of their selling times. Cells of different sales are
+    added up, so the table grows with every move to sold without being recomputed,
+    and the mean and the quantiles of any group are read from the summed bins.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Sold listings with the dimensions, the publication date and the sold date.
+    dimensions: list
+        Grouping columns.
+    published, sold: str
+        Columns of the publication and the sold date.
+
+    Returns
+    -------
+    pd.DataFrame
+        sold_day, the dimensions, bin, count and days per cell.
+    """
+    sold_date = pd.to_datetime(df[sold])
+    days = ((sold_date - pd.to_datetime(df[published])).dt.total_seconds() / 86400).to_numpy()
+    timed = ~np.isnan(days)
+    # A listing published later on the day it was moved has a negative time, it goes to the first bin
+    bins = np.clip(np.searchsorted(BINS, days, side='right') - 1, 0, len(BINS) - 2)
+    cells = pd.DataFrame({DAY: sold_date.dt.strftime('%Y-%m-%d').to_numpy()})
+    for dimension in dimensions:
+        cells[dimension] = df[dimension].to_numpy()
+    cells['bin'] = np.where(timed, bins, UNKNOWN_BIN)
+    cells['count'] = 1
+    cells['days'] = np.where(timed, days, 0)
+    return cells.groupby([DAY] + list(dimensions) + ['bin'], dropna=False, sort=False).sum().reset_index()
+
+
+def quantiles(hist, q):
+    """
+    Quantile of every row of a histogram over BINS, interpolated within its bin.
+
+    Parameters
+    ----------
+    hist: np.ndarray
+        Sales per group (rows) and bin (columns).
+    q: float
+        Quantile between 0 and 1.
+
+    Returns
+    -------
+    np.ndarray
+        Days per group, NaN for groups without sales. The error is at most the width of the bin.
+    """
+    total = hist.sum(axis=1)
+    cumulative = hist.cumsum(axis=1)
+    target = q * total
+    # First bin whose cumulative count reaches the target
+    found = np.minimum((cumulative < target[:, None]).sum(axis=1), hist.shape[1] - 1)
+    rows = np.arange(len(hist))
+    before = np.where(found > 0, cumulative[rows, np.maximum(found - 1, 0)], 0)
+    inside = hist[rows, found]
+    low, high = BINS[found], BINS[found + 1]
+    # The last bin has no upper edge, its quantiles are its lower edge
+    width = np.where(np.isinf(high), 0, high - low)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        value = low + np.where(inside > 0, (target - before) / inside, 0) * width
+    return np.where(total > 0, value, np.nan)
+
+
+def sold_time_stats(cells, by=None):
+    """
+    Selling time statistics of the cells per group.
+
+    Parameters
+    ----------
+    cells: pd.DataFrame
+        Selling time cells, see sold_time_cells().
+    by: list, optional
+        Grouping columns, one row for all cells by default.
+
+    Returns
+    -------
+    pd.DataFrame
+        count, mean, median and p90 (days) per group, groups without timed sales are left out.
+    """
+    by = list(by or [])
+    cells = cells[cells['bin'] != UNKNOWN_BIN]
+    keys = [cells[column] for column in by] if by else [np.zeros(len(cells), dtype=np.int64)]
+    hist = (cells.groupby(keys + [cells['bin']], dropna=False)['count'].sum()
+            .unstack('bin', fill_value=0).reindex(columns=range(len(BINS) - 1), fill_value=0))
+    days = cells.groupby(keys, dropna=False)['days'].sum().reindex(hist.index)
+    counts = hist.to_numpy()
+    stats = pd.DataFrame({'count': counts.sum(axis=1)}, index=hist.index)
+    stats['mean'] = days / stats['count']
+    stats['median'] = quantiles(counts, 0.5)
+    stats['p90'] = quantiles(counts, 0.9)
+    return stats
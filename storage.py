@@ -0,0 +1,526 @@
+import sqlite3  # Importing sqlite3 for the embedded listing database
+import threading  # Importing threading for serializing access from worker threads
+import logging  # Importing logging for logging storage events
+import os
+from datetime import datetime  # Importing datetime for the run timestamps
+
+import numpy as np  # Importing numpy for the PostID arrays
+import pandas as pd  # Importing pandas library for data manipulation
+
+from records import FIELDS
+from normalize import normalize
+import soldtime
+
+
+DB_PATH = 'somon.db'  # Default location of the listing database
+
+# Column order of the "today" and "sold" tables (matches the exported workbooks)
+TODAY_COLUMNS = FIELDS + ['Mark', 'Model']
+SOLD_COLUMNS = FIELDS + ['sold_date', 'Mark', 'Model']
+# Key of the selling time table: day, dimensions and bin (missing dimensions are stored as '')
+SOLD_TIME_KEY = [soldtime.DAY] + soldtime.DIMENSIONS + ['bin']
+
+# SQLite column types, everything not listed here is stored as TEXT
+COLUMN_TYPES = {
+    'PostID': 'INTEGER PRIMARY KEY',
+    'AuthorID': 'INTEGER',
+    'WhatsApp': '',
+    'Price': 'INTEGER',
+    'Год выпуска': 'INTEGER',
+    'Объем двигателя': 'REAL',
+    'DatePublished': 'TIMESTAMP',
+    'Views': 'INTEGER',
+}
+
+
+def _quote(column):
+    # Quoting column names, most of them contain spaces or cyrillic letters
+    return '"{}"'.format(column.replace('"', '""'))
+
+
+def _ddl(table, columns):
+    # Building CREATE TABLE statement for the given column list
+    definitions = ', '.join(f'{_quote(c)} {COLUMN_TYPES.get(c, "TEXT")}'.rstrip() for c in columns)
+    return f'CREATE TABLE IF NOT EXISTS {table} ({definitions})'
+
+
+def _to_rows(df, columns):
+    """
+    Converts a dataframe into a list of plain python tuples ready for sqlite3.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Dataframe with (a subset of) the table columns.
+    columns: list
+        Columns of the target table, missing ones are filled with None.
+
+    Returns
+    -------
+    list
+        One tuple per row, numpy scalars and NaN/NaT replaced by python values/None.
+    """
+    df = df.reindex(columns=columns)
+    for column in df.columns:
+        # sqlite3 can not bind pandas timestamps, storing them as ISO strings
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+class ListingStore:
+    """
+    SQLite backed storage of the listings keyed by PostID.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        Location of the database file.
+
+    Methods
+    -------
+    upsert_today(df):
+        Inserts new listings or replaces existing ones in the "today" table.
+    move_to_sold(postids, sold_date):
+        Moves listings from "today" to "sold" in a single transaction.
+    append_sold(df):
+        Adds listings straight to the "sold" table.
+    read_sold_time():
+        Loads the selling time cells, kept up to date by move_to_sold() and append_sold().
+    read_sellers():
+        Loads the sellers (AuthorID, name, listings, sold, price), kept up to date by every write.
+    read_today() / read_sold() / read_links():
+        Load a table into a dataframe.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()  # sqlite3 connections are not safe to share without a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')  # Readers (dashboard/export) do not block the scraper
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.create_tables()
+        self.migrate()
+
+    def create_tables(self):
+        with self.lock, self.conn:
+            self.conn.execute(_ddl('today', TODAY_COLUMNS))
+            self.conn.execute(_ddl('sold', SOLD_COLUMNS))
+            self.conn.execute('CREATE TABLE IF NOT EXISTS links (PostID INTEGER PRIMARY KEY, Link TEXT)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            # DatePublished is stored as ISO text, so date ranges are index range scans
+            self.conn.execute('CREATE INDEX IF NOT EXISTS today_published ON today (DatePublished)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS sold_published ON sold (DatePublished)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, mode TEXT, '
+                              'started TEXT, finished TEXT, links INTEGER, new INTEGER, gone INTEGER, '
+                              'kept INTEGER, failed_pages INTEGER, downloaded INTEGER)')
+            # Price/views history: one event per change, values stored as deltas to the previous event
+            self.conn.execute('CREATE TABLE IF NOT EXISTS history (PostID INTEGER, observed_at TEXT, '
+                              'price_delta INTEGER, views_delta INTEGER, PRIMARY KEY (PostID, observed_at)) '
+                              'WITHOUT ROWID')
+            # Last known values of every listing, the deltas are computed against them
+            self.conn.execute('CREATE TABLE IF NOT EXISTS latest (PostID INTEGER PRIMARY KEY, Price INTEGER, '
+                              'Views INTEGER, first_seen TEXT, observed_at TEXT, checked_at TEXT)')
+            # Selling time cells of the sold listings, see soldtime.sold_time_cells
+            self.conn.execute('CREATE TABLE IF NOT EXISTS sold_time (sold_day TEXT, Mark TEXT, Model TEXT, '
+                              'City TEXT, "Кузов" TEXT, bin INTEGER, count INTEGER, days REAL, '
+                              'PRIMARY KEY (sold_day, Mark, Model, City, "Кузов", bin)) WITHOUT ROWID')
+            # Sellers: name of the newest listing, listings on the site, sold listings and the
+            # price sum and count of the listings on the site
+            self.conn.execute('CREATE TABLE IF NOT EXISTS sellers (AuthorID INTEGER PRIMARY KEY, AuthorName TEXT, '
+                              'listings INTEGER, sold INTEGER, price_sum INTEGER, price_count INTEGER)')
+            # A seller is recounted from its own listings only
+            self.conn.execute('CREATE INDEX IF NOT EXISTS today_author ON today (AuthorID)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS sold_author ON sold (AuthorID)')
+
+    def migrate(self):
+        # Normalizing rows written before the ingest normalization stage existed (runs once)
+        if self.get_meta('normalized') is None:
+            # Reading the raw text, DatePublished is still in the site format there
+            today = self._read(f'SELECT {", ".join(_quote(c) for c in TODAY_COLUMNS)} FROM today')
+            sold = self._read(f'SELECT {", ".join(_quote(c) for c in SOLD_COLUMNS)} FROM sold',
+                              parse_dates=['sold_date'])
+            self.upsert_today(normalize(today))
+            self.append_sold(normalize(sold))
+            self.set_meta('normalized', 1)
+        # Starting the history of the stored listings with their values at publication (runs once)
+        if self.get_meta('history') is None:
+            self.seed_history()
+            self.set_meta('history', 1)
+        # Counting the listings sold before the selling time table existed (runs once)
+        if self.get_meta('sold_time') is None:
+            self.rebuild_sold_time()
+            self.set_meta('sold_time', 1)
+        # Counting the sellers of the stored listings (runs once)
+        if self.get_meta('sellers') is None:
+            self.rebuild_sellers()
+            self.set_meta('sellers', 1)
+
+    def seed_history(self):
+        # Using the stored values as the first observation (at publication) of listings without history
+        with self.lock, self.conn:
+            for table in ('today', 'sold'):
+                self.conn.execute(f'INSERT OR IGNORE INTO latest SELECT PostID, Price, Views, DatePublished, '
+                                  f'DatePublished, DatePublished FROM {table} WHERE DatePublished IS NOT NULL')
+                self.conn.execute(f'INSERT OR IGNORE INTO history SELECT t.PostID, t.DatePublished, '
+                                  f'COALESCE(t.Price, 0), COALESCE(t.Views, 0) FROM {table} t '
+                                  f'JOIN latest l ON l.PostID = t.PostID AND l.first_seen = t.DatePublished')
+
+    def count(self, table):
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def _insert(self, table, columns, df, replace=True):
+        # Writing rows with INSERT OR REPLACE so that PostID works as an upsert key
+        rows = _to_rows(df, columns)
+        if not rows:
+            return 0
+        with self.lock, self.conn:
+            self._insert_rows(table, columns, rows, replace)
+        return len(rows)
+
+    def _insert_rows(self, table, columns, rows, replace=True):
+        # Executing the insert, the caller holds the lock
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        placeholders = ', '.join('?' for _ in columns)
+        sql = f'{verb} INTO {table} ({", ".join(_quote(c) for c in columns)}) VALUES ({placeholders})'
+        self.conn.executemany(sql, rows)
+        return len(rows)
+
+    def _stage(self, postids):
+        # Filling the temporary table of the PostIDs a statement works on, the caller holds the lock
+        # (a temporary table instead of a huge IN (...) list)
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS moved (PostID INTEGER PRIMARY KEY)')
+        self.conn.execute('DELETE FROM moved')
+        self.conn.executemany('INSERT OR IGNORE INTO moved VALUES (?)', postids)
+
+    def _staged_sold_time(self):
+        # Selling time cells of the staged listings in "sold", the caller holds the lock
+        columns = ', '.join(_quote(c) for c in soldtime.DIMENSIONS + ['DatePublished', 'sold_date'])
+        sold = pd.read_sql_query(f'SELECT {columns} FROM sold WHERE PostID IN (SELECT PostID FROM moved)',
+                                 self.conn, parse_dates=['DatePublished', 'sold_date'])
+        # NULL can not be part of the primary key, missing values are counted under ''
+        sold[soldtime.DIMENSIONS] = sold[soldtime.DIMENSIONS].fillna('')
+        return soldtime.sold_time_cells(sold).fillna({soldtime.DAY: ''})
+
+    def _count_sold_time(self, cells, sign=1):
+        # Adding (sign=1) or removing (sign=-1) selling time cells, the caller holds the lock
+        if cells.empty:
+            return
+        cells = cells.assign(count=sign * cells['count'], days=sign * cells['days'])
+        columns = SOLD_TIME_KEY + ['count', 'days']
+        key = ', '.join(_quote(c) for c in SOLD_TIME_KEY)
+        self.conn.executemany(
+            f'INSERT INTO sold_time ({", ".join(_quote(c) for c in columns)}) '
+            f'VALUES ({", ".join("?" for _ in columns)}) ON CONFLICT ({key}) '
+            f'DO UPDATE SET count = count + excluded.count, days = days + excluded.days',
+            _to_rows(cells, columns))
+        if sign < 0:
+            self.conn.execute('DELETE FROM sold_time WHERE count <= 0')
+
+    def _replace_sold(self, postids, write):
+        # Running write() on "sold" and updating the selling time cells and the sellers of the touched
+        # listings, a replaced row is first taken out of the cells so it is never counted twice
+        with self.lock, self.conn:
+            self._stage(postids)
+            self._count_sold_time(self._staged_sold_time(), -1)
+            written = write()
+            self._count_sold_time(self._staged_sold_time())
+            self._refresh_sellers('sold')
+        return written
+
+    def _count_sellers(self, where=''):
+        # Inserting the sellers counted from their listings in "today" and "sold", the caller holds the lock
+        # (with a single max() SQLite takes AuthorName from the row of the newest PostID)
+        listings = (f'SELECT AuthorID, AuthorName, PostID, Price, 1 AS listing FROM today {where} '
+                    f'UNION ALL SELECT AuthorID, AuthorName, PostID, Price, 0 FROM sold {where}')
+        self.conn.execute(
+            'INSERT OR REPLACE INTO sellers SELECT AuthorID, AuthorName, listings, sold, price_sum, price_count '
+            'FROM (SELECT AuthorID, AuthorName, MAX(PostID), SUM(listing) AS listings, SUM(1 - listing) AS sold, '
+            'COALESCE(SUM(CASE WHEN listing THEN Price END), 0) AS price_sum, '
+            f'COUNT(CASE WHEN listing THEN Price END) AS price_count FROM ({listings}) '
+            'WHERE AuthorID IS NOT NULL GROUP BY AuthorID)')
+
+    def _refresh_sellers(self, table):
+        # Recounting the sellers of the staged listings of a table, the caller holds the lock
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS authors (AuthorID INTEGER PRIMARY KEY)')
+        self.conn.execute('DELETE FROM authors')
+        self.conn.execute(f'INSERT OR IGNORE INTO authors SELECT AuthorID FROM {table} '
+                          f'WHERE PostID IN (SELECT PostID FROM moved) AND AuthorID IS NOT NULL')
+        # A seller without listings left is dropped, the others are replaced
+        self.conn.execute('DELETE FROM sellers WHERE AuthorID IN (SELECT AuthorID FROM authors)')
+        self._count_sellers('WHERE AuthorID IN (SELECT AuthorID FROM authors)')
+
+    def rebuild_sellers(self):
+        # Recounting every seller
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM sellers')
+            self._count_sellers()
+
+    def rebuild_sold_time(self):
+        # Recomputing the selling time cells of every sold listing
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM sold_time')
+            self._stage([(row[0],) for row in self.conn.execute('SELECT PostID FROM sold')])
+            self._count_sold_time(self._staged_sold_time())
+
+    def upsert_today(self, df):
+        # Adding freshly downloaded listings, rows with a known PostID are replaced
+        rows = _to_rows(df, TODAY_COLUMNS)
+        written = 0
+        if rows:
+            with self.lock, self.conn:
+                written = self._insert_rows('today', TODAY_COLUMNS, rows)
+                # Recounting the sellers of the written listings in the same transaction
+                self._stage([(int(row[TODAY_COLUMNS.index('PostID')]),) for row in rows])
+                self._refresh_sellers('today')
+        logging.info(f'ListingStore: {written} rows upserted into today')
+        return written
+
+    def append_sold(self, df):
+        # Adding listings that were already sold when their page was downloaded
+        rows = _to_rows(df, SOLD_COLUMNS)
+        written = 0
+        if rows:
+            postids = [(int(row[SOLD_COLUMNS.index('PostID')]),) for row in rows]
+            written = self._replace_sold(postids, lambda: self._insert_rows('sold', SOLD_COLUMNS, rows))
+        logging.info(f'ListingStore: {written} rows appended to sold')
+        return written
+
+    def move_to_sold(self, postids, sold_date):
+        """
+        Moves listings from "today" to "sold" without rewriting either table.
+
+        Parameters
+        ----------
+        postids: list
+            PostIDs that disappeared from the site.
+        sold_date: datetime
+            Date stored in the sold_date column of the moved rows.
+
+        Returns
+        -------
+        int
+            Number of moved rows.
+        """
+        postids = [(int(i),) for i in postids]
+        if not postids:
+            return 0
+        sold_date = pd.Timestamp(sold_date).strftime('%Y-%m-%d %H:%M:%S')
+        today_columns = ', '.join(_quote(c) for c in FIELDS + ['Mark', 'Model'])
+        sold_columns = ', '.join(_quote(c) for c in FIELDS + ['Mark', 'Model', 'sold_date'])
+
+        def write():
+            cursor = self.conn.execute(
+                f'INSERT OR REPLACE INTO sold ({sold_columns}) '
+                f'SELECT {today_columns}, ? FROM today WHERE PostID IN (SELECT PostID FROM moved)',
+                (sold_date,))
+            self.conn.execute('DELETE FROM today WHERE PostID IN (SELECT PostID FROM moved)')
+            return cursor.rowcount
+
+        # One transaction: the rows leave "today", enter "sold" and are counted in the selling times
+        moved = self._replace_sold(postids, write)
+        logging.info(f'ListingStore: {moved} rows moved to sold')
+        return moved
+
+    def record_observations(self, df, observed_at):
+        """
+        Appends a history event for every listing whose price or views changed.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            PostID, Price and Views of the observed listings.
+        observed_at: datetime
+            Time of the observation.
+
+        Returns
+        -------
+        int
+            Number of appended events (first observations included).
+        """
+        rows = _to_rows(df.drop_duplicates('PostID', keep='last'), ['PostID', 'Price', 'Views'])
+        if not rows:
+            return 0
+        observed_at = pd.Timestamp(observed_at).strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS observed (PostID INTEGER PRIMARY KEY, '
+                              'Price INTEGER, Views INTEGER)')
+            self.conn.execute('DELETE FROM observed')
+            self.conn.executemany('INSERT OR REPLACE INTO observed VALUES (?, ?, ?)', rows)
+            # A value missing on the page keeps the last known one
+            self.conn.execute('UPDATE observed SET '
+                              'Price = COALESCE(Price, (SELECT Price FROM latest l WHERE l.PostID = observed.PostID)), '
+                              'Views = COALESCE(Views, (SELECT Views FROM latest l WHERE l.PostID = observed.PostID))')
+            # Deltas against the last known values, a first observation is a delta from zero
+            appended = self.conn.execute(
+                'INSERT OR REPLACE INTO history SELECT o.PostID, ?, '
+                'COALESCE(o.Price, 0) - COALESCE(l.Price, 0), COALESCE(o.Views, 0) - COALESCE(l.Views, 0) '
+                'FROM observed o LEFT JOIN latest l ON l.PostID = o.PostID '
+                'WHERE l.PostID IS NULL OR o.Price IS NOT l.Price OR o.Views IS NOT l.Views',
+                (observed_at,)).rowcount
+            self.conn.execute(
+                'INSERT INTO latest SELECT PostID, Price, Views, ?, ?, ? FROM observed WHERE true '
+                'ON CONFLICT (PostID) DO UPDATE SET checked_at = excluded.checked_at, '
+                'observed_at = CASE WHEN latest.Price IS NOT excluded.Price OR latest.Views IS NOT excluded.Views '
+                'THEN excluded.observed_at ELSE latest.observed_at END, '
+                'Price = excluded.Price, Views = excluded.Views',
+                (observed_at, observed_at, observed_at))
+        return appended
+
+    def mark_checked(self, postids, checked_at):
+        # Recording that unchanged listings were looked at, so the next recrawl starts with others
+        checked_at = pd.Timestamp(checked_at).strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock, self.conn:
+            self.conn.executemany('UPDATE latest SET checked_at = ? WHERE PostID = ?',
+                                  [(checked_at, int(i)) for i in postids])
+
+    def stale_links(self, checked_before, limit=None):
+        # Returning links of listings on the site that were not checked since the given time, oldest first
+        sql = ('SELECT k.Link FROM today t JOIN links k ON k.PostID = t.PostID '
+               'LEFT JOIN latest l ON l.PostID = t.PostID '
+               'WHERE l.checked_at IS NULL OR l.checked_at < ? ORDER BY l.checked_at')
+        params = [pd.Timestamp(checked_before).strftime('%Y-%m-%d %H:%M:%S')]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        with self.lock:
+            return [row[0] for row in self.conn.execute(sql, params)]
+
+    def read_history(self, postids=None):
+        # Loading the history with the absolute price and views of every event (running sums of the deltas)
+        where = ''
+        if postids is not None:
+            where = f'WHERE PostID IN ({", ".join(str(int(i)) for i in postids)})'
+        history = self._read(f'SELECT * FROM history {where} ORDER BY PostID, observed_at', parse_dates=['observed_at'])
+        history = history.astype({'PostID': 'int64', 'price_delta': 'int64', 'views_delta': 'int64'})
+        grouped = history.groupby('PostID')
+        history['Price'] = grouped['price_delta'].cumsum()
+        history['Views'] = grouped['views_delta'].cumsum()
+        return history
+
+    def price_drops(self, since=None, min_drop=1):
+        # Listings whose current price is at least min_drop lower than their first observed price
+        where = 'AND l.observed_at >= ?' if since is not None else ''
+        params = [min_drop] + ([pd.Timestamp(since).strftime('%Y-%m-%d %H:%M:%S')] if since is not None else [])
+        sql = ('SELECT l.PostID, f.price_delta AS first_price, l.Price AS price, '
+               'f.price_delta - l.Price AS drop_amount, f.observed_at AS first_seen, l.observed_at AS changed_at '
+               'FROM latest l JOIN history f ON f.PostID = l.PostID AND f.observed_at = l.first_seen '
+               f'WHERE f.price_delta - l.Price >= ? {where} ORDER BY drop_amount DESC')
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=params, parse_dates=['first_seen', 'changed_at'])
+
+    def view_velocity(self, min_days=1):
+        # Views per day between the first and the last observation of every listing watched for min_days
+        sql = ('SELECT l.PostID, l.Views - f.views_delta AS views_gained, '
+               'julianday(l.checked_at) - julianday(l.first_seen) AS days, '
+               '(l.Views - f.views_delta) / (julianday(l.checked_at) - julianday(l.first_seen)) AS views_per_day '
+               'FROM latest l JOIN history f ON f.PostID = l.PostID AND f.observed_at = l.first_seen '
+               'WHERE julianday(l.checked_at) - julianday(l.first_seen) >= ? ORDER BY views_per_day DESC')
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=[min_days])
+
+    def _ids(self, sql):
+        # Reading PostIDs straight into a sorted int64 array (the primary key is already in order)
+        with self.lock:
+            return np.fromiter((row[0] for row in self.conn.execute(sql)), dtype=np.int64)
+
+    def today_ids(self):
+        # Returning PostIDs of all listings that are currently on the site
+        return self._ids('SELECT PostID FROM today ORDER BY PostID')
+
+    def known_ids(self):
+        # Returning PostIDs of every listing in the store, on the site or sold
+        return self._ids('SELECT PostID FROM today UNION SELECT PostID FROM sold ORDER BY 1')
+
+    def save_links(self, links):
+        # Replacing the links of the last crawl
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM links')
+        return self._insert('links', ['PostID', 'Link'], links)
+
+    def add_links(self, links):
+        # Adding links found by a partial crawl, the links of the last full crawl are kept
+        return self._insert('links', ['PostID', 'Link'], links)
+
+    def get_meta(self, key, default=None):
+        # Reading a value of the run metadata
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def set_meta(self, key, value):
+        # Saving a value of the run metadata
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def start_run(self, mode):
+        # Recording the start of an update, returns its run_id
+        with self.lock, self.conn:
+            cursor = self.conn.execute('INSERT INTO runs (mode, started) VALUES (?, ?)',
+                                       (mode, datetime.now().isoformat(timespec='seconds')))
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, stats):
+        # Saving the counters of a finished update (links, new, gone, kept, failed_pages, downloaded)
+        columns = [c for c in ('links', 'new', 'gone', 'kept', 'failed_pages', 'downloaded') if c in stats]
+        assignments = ''.join(f', {c} = ?' for c in columns)
+        with self.lock, self.conn:
+            self.conn.execute(f'UPDATE runs SET finished = ?{assignments} WHERE run_id = ?',
+                              [datetime.now().isoformat(timespec='seconds')]
+                              + [int(stats[c]) for c in columns] + [run_id])
+
+    def read_runs(self):
+        # Loading the history of updates
+        return self._read('SELECT * FROM runs ORDER BY run_id')
+
+    def _read(self, sql, parse_dates=None):
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, parse_dates=parse_dates)
+
+    def read_today(self):
+        columns = ', '.join(_quote(c) for c in TODAY_COLUMNS)
+        return self._read(f'SELECT {columns} FROM today', parse_dates=['DatePublished'])
+
+    def read_sold(self):
+        columns = ', '.join(_quote(c) for c in SOLD_COLUMNS)
+        return self._read(f'SELECT {columns} FROM sold', parse_dates=['DatePublished', 'sold_date'])
+
+    def read_prices(self, since=None):
+        # Loading Mark, Model, Price and DatePublished of every listing (today and sold) published since a date
+        where, params = '', []
+        if since is not None:
+            where = 'WHERE DatePublished >= ?'
+            params = [pd.Timestamp(since).strftime('%Y-%m-%d %H:%M:%S')]
+        sql = (f'SELECT Mark, Model, Price, DatePublished FROM today {where} '
+               f'UNION ALL SELECT Mark, Model, Price, DatePublished FROM sold {where}')
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=params * 2, parse_dates=['DatePublished'])
+
+    def read_links(self):
+        return self._read('SELECT Link, PostID FROM links')
+
+    def read_sold_time(self):
+        # Loading the selling time cells, '' is turned back into a missing value
+        cells = self._read('SELECT * FROM sold_time')
+        keys = [soldtime.DAY] + soldtime.DIMENSIONS
+        cells[keys] = cells[keys].mask(cells[keys] == '')
+        return cells
+
+    def read_sellers(self):
+        return self._read('SELECT * FROM sellers')
+
+    def import_excel(self, today_path='ttoday.xlsx', sold_path='sold.xlsx'):
+        # One-time migration of the old Excel working set into the database
+        if os.path.exists(today_path):
+            self.upsert_today(normalize(pd.read_excel(today_path)))
+        if os.path.exists(sold_path):
+            self.append_sold(normalize(pd.read_excel(sold_path)))
+        self.seed_history()
+        logging.info(f'ListingStore: imported {today_path} and {sold_path}')
+
+    def close(self):
+        self.conn.close()
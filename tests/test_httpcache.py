@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from httpcache import HttpCache  # noqa: E402
+
+KB = 1024
+
+
+def cached(cache, url, size, used_at):
+    # Storing an incompressible body of the given size and setting its last use
+    cache.save(url, {}, os.urandom(size), None)
+    with cache.conn:
+        cache.conn.execute('UPDATE responses SET used_at = ? WHERE url = ?', (used_at, url))
+
+
+def test_evict_expired_bodies_do_not_count_against_the_size_limit(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl_hours=1, max_mb=1)
+    now = time.time()
+    cached(cache, 'expired', 600 * KB, now - 2 * 3600)
+    cached(cache, 'older', 600 * KB, now - 60)
+    cached(cache, 'newer', 300 * KB, now)
+
+    cache.evict()
+
+    urls = {url for (url,) in cache.conn.execute('SELECT url FROM responses')}
+    # The expired entry is dropped by the TTL, the two live ones (900 KB) fit under 1 MB
+    assert urls == {'older', 'newer'}
+    assert cache.conn.execute('SELECT COUNT(*) FROM bodies').fetchone()[0] == 2
+    cache.close()
+
+
+def test_evict_drops_least_recently_used_above_the_size_limit(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl_hours=1, max_mb=1)
+    now = time.time()
+    cached(cache, 'expired', 600 * KB, now - 2 * 3600)
+    cached(cache, 'oldest', 600 * KB, now - 120)
+    cached(cache, 'older', 300 * KB, now - 60)
+    cached(cache, 'newer', 300 * KB, now)
+
+    cache.evict()
+
+    urls = {url for (url,) in cache.conn.execute('SELECT url FROM responses')}
+    assert urls == {'older', 'newer'}
+    cache.close()